@@ -0,0 +1,47 @@
+"""
+Benchmark StringService.longest_palindrome on multi-MB inputs.
+
+Run from the repository root:
+    python -m benchmarks.palindrome [size_in_mb ...]
+(importing src.service reads DATABASE_URL, but no database is touched).
+
+Manacher's algorithm is linear, so seconds per MB should stay flat as the
+input grows; a quadratic implementation would not finish on these sizes.
+"""
+import random
+import sys
+import time
+
+from src.service import StringService
+
+string_service = StringService()
+
+
+def inputs(size: int):
+    # Worst case for naive expansion: long runs of one character
+    yield "uniform", "a" * size
+    # Random text over a tiny alphabet: many short overlapping palindromes
+    rng = random.Random(0)
+    yield "random", "".join(rng.choice("ab") for _ in range(size))
+    # One long palindrome buried in noise
+    half = "".join(rng.choice("abcdefgh") for _ in range(size // 4))
+    noise = "".join(rng.choice("xyz") for _ in range(size // 4))
+    yield "buried", noise + half + half[::-1] + noise
+
+
+def main(sizes_mb: list[float]):
+    print(f"{'input':<10}{'size':>12}{'seconds':>10}{'s/MB':>8}{'longest':>12}")
+    for size_mb in sizes_mb:
+        size = int(size_mb * 1_000_000)
+        for name, value in inputs(size):
+            start = time.perf_counter()
+            _, length, _ = string_service.longest_palindrome(value)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:<10}{len(value):>12}{elapsed:>10.2f}"
+                f"{elapsed / (len(value) / 1_000_000):>8.2f}{length:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main([float(arg) for arg in sys.argv[1:]] or [1, 2, 4])
@@ -0,0 +1,122 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from src.db import config
+from src.error import ServiceOverloaded
+from src.log import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__, "admission.log")
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded, deadline-aware wait queue.
+
+    At most `limit` requests run at once and at most `queue_size` wait for a
+    slot. A request is rejected straight away when the queue is full or when
+    the expected wait (from a moving average of service time) already
+    exceeds `timeout`, and otherwise after waiting `timeout` seconds, so
+    callers get a fast 503 instead of piling up on the database pool.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.rejected = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._service_time = 0.0  # exponential moving average, seconds
+
+    def _expected_wait(self, position: int) -> float:
+        return position * self._service_time / self.limit
+
+    def _reject(self, reason: str, expected_wait: float):
+        self.rejected += 1
+        retry_after = max(1, math.ceil(expected_wait))
+        logger.warning(
+            f"Rejecting request on '{self.name}' ({reason}): active={self.active}, waiting={len(self._waiters)}."
+        )
+        raise ServiceOverloaded(
+            f"Server is busy, retry in {retry_after}s.", retry_after=retry_after
+        )
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+
+        position = len(self._waiters) + 1
+        expected_wait = self._expected_wait(position)
+        if len(self._waiters) >= self.queue_size:
+            self._reject("queue full", expected_wait)
+        if expected_wait > self.timeout:
+            self._reject("deadline would be missed", expected_wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # The slot was handed over just as the timeout fired
+                return
+            self._waiters.remove(waiter)
+            self._reject("timed out waiting", self._expected_wait(len(self._waiters) + 1))
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        # Hand the slot straight to the next waiter, if any, so it can't be stolen
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def admit(self):
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            self.release()
+
+
+# Cheap point operations and expensive scans get separate budgets, so a
+# burst of filter queries cannot starve single-string lookups
+cheap_admission = AdmissionController(
+    "cheap",
+    limit=config.CHEAP_ROUTE_CONCURRENCY,
+    queue_size=config.CHEAP_ROUTE_QUEUE_SIZE,
+    timeout=config.ADMISSION_TIMEOUT_SECONDS,
+)
+expensive_admission = AdmissionController(
+    "expensive",
+    limit=config.EXPENSIVE_ROUTE_CONCURRENCY,
+    queue_size=config.EXPENSIVE_ROUTE_QUEUE_SIZE,
+    timeout=config.ADMISSION_TIMEOUT_SECONDS,
+)
+
+
+async def admit_cheap():
+    async with cheap_admission.admit():
+        yield
+
+
+async def admit_expensive():
+    async with expensive_admission.admit():
+        yield
@@ -0,0 +1,61 @@
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db import WriteGenerations, seed_generation
+
+
+async def bump_generation(session: AsyncSession):
+    """
+    Advance the database's persisted write generation inside the caller's
+    transaction, so it commits (or rolls back) together with the write.
+    """
+    bump = (
+        update(WriteGenerations)
+        .where(WriteGenerations.id == 1)
+        .values(value=WriteGenerations.value + 1)
+    )
+    result = await session.execute(bump)
+    if result.rowcount == 0:
+        # init_db seeds the row; a database created without it gets it here,
+        # without racing another writer doing the same
+        await session.execute(seed_generation(session.bind.dialect.name))
+        await session.execute(bump)
+
+
+async def read_generation(session: AsyncSession) -> str:
+    row = (
+        await session.execute(
+            select(WriteGenerations.epoch, WriteGenerations.value).where(
+                WriteGenerations.id == 1
+            )
+        )
+    ).first()
+    return f"{row.epoch}.{row.value}" if row else "0"
+
+
+def strong_etag(sha256_hash: str) -> str:
+    # A stored string's properties never change, so its hash is a strong validator
+    return f'"{sha256_hash}"'
+
+
+def filter_etag(generations: list[str]) -> str:
+    # Filter results can only change when some shard's generation does
+    return f'W/"{"-".join(generations)}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against an ETag, as required
+    for conditional GET (RFC 9110 13.1.2).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
@@ -0,0 +1,225 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db import Strings
+from src.log import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__, "columnar.log")
+
+# LIKE wildcards: the database matches these as patterns, not literally
+LIKE_WILDCARDS = {"%", "_"}
+
+
+def _timestamp(created_at: datetime) -> float:
+    # SQLite hands back naive datetimes holding UTC wall time
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.timestamp()
+
+
+class ColumnarReplica:
+    """
+    In-memory column store mirroring the filterable columns of live strings.
+
+    Scalar columns are NumPy arrays and character presence is a bitset per
+    row (one bit per distinct lower-cased character seen so far), so a filter
+    query becomes a handful of vectorized comparisons ANDed into one boolean
+    mask. Only the sha256 hashes of the requested page leave the replica;
+    full rows are then fetched by hash.
+
+    Like the similarity index, storage is over-allocated and doubled on
+    demand, and deletes swap the last row into the freed slot.
+    """
+
+    def __init__(self, capacity: int = 1024, words: int = 1):
+        self.ready = False
+        self._size = 0
+        self._length = np.zeros(capacity, dtype=np.int32)
+        self._word_count = np.zeros(capacity, dtype=np.int32)
+        self._is_palindrome = np.zeros(capacity, dtype=bool)
+        self._longest_palindrome_length = np.zeros(capacity, dtype=np.int32)
+        self._created_at = np.zeros(capacity, dtype=np.float64)
+        self._hashes = np.zeros(capacity, dtype="S64")
+        self._characters = np.zeros((capacity, words), dtype=np.uint64)
+        self._vocab: dict[str, int] = {}
+        self._rows: dict[str, int] = {}  # sha256_hash -> row
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, sha256_hash: str) -> bool:
+        return sha256_hash in self._rows
+
+    def clear(self):
+        self.__init__()
+
+    def _columns(self) -> list[str]:
+        return [
+            "_length",
+            "_word_count",
+            "_is_palindrome",
+            "_longest_palindrome_length",
+            "_created_at",
+            "_hashes",
+        ]
+
+    def _grow(self, rows: int, bits: int):
+        capacity, words = self._characters.shape
+        if rows <= capacity and bits <= words * 64:
+            return
+        while capacity < rows:
+            capacity *= 2
+        while words * 64 < bits:
+            words *= 2
+        for name in self._columns():
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[: self._size] = column[: self._size]
+            setattr(self, name, grown)
+        characters = np.zeros((capacity, words), dtype=np.uint64)
+        characters[: self._size, : self._characters.shape[1]] = self._characters[: self._size]
+        self._characters = characters
+
+    def _bit(self, char: str) -> tuple[int, np.uint64]:
+        column = self._vocab[char]
+        return column // 64, np.uint64(1 << (column % 64))
+
+    def add(self, string):
+        """
+        Mirror one live string. Accepts a `Strings` object or any row with the
+        same attribute names.
+        """
+        if string.sha256_hash in self._rows:
+            return
+        characters = set(string.value.lower())
+        for char in characters:
+            if char not in self._vocab:
+                self._vocab[char] = len(self._vocab)
+        self._grow(self._size + 1, len(self._vocab))
+
+        row = self._size
+        self._length[row] = string.length
+        self._word_count[row] = string.word_count
+        self._is_palindrome[row] = string.is_palindrome
+        self._longest_palindrome_length[row] = string.longest_palindrome_length
+        self._created_at[row] = _timestamp(string.created_at)
+        self._hashes[row] = string.sha256_hash.encode()
+        self._characters[row] = 0
+        for char in characters:
+            word, bit = self._bit(char)
+            self._characters[row, word] |= bit
+        self._rows[string.sha256_hash] = row
+        self._size += 1
+
+    def remove(self, sha256_hash: str):
+        row = self._rows.pop(sha256_hash, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            # Move the last row into the hole to keep the columns dense
+            for name in self._columns():
+                column = getattr(self, name)
+                column[row] = column[last]
+            self._characters[row] = self._characters[last]
+            self._rows[self._hashes[row].decode()] = row
+        self._size -= 1
+
+    def supports(self, contains: Optional[str] = None, contains_character: Optional[str] = None, **_) -> bool:
+        # Substring filters need the stored values (the trigram index answers
+        # them in the database); a character filter needs exactly one literal
+        # character to map onto a presence bit
+        if contains is not None:
+            return False
+        if contains_character is not None:
+            return len(contains_character) == 1 and contains_character not in LIKE_WILDCARDS
+        return True
+
+    def _mask(
+        self,
+        is_palindrome: Optional[bool] = None,
+        min_length: Optional[int] = None,
+        max_length: Optional[int] = None,
+        word_count: Optional[int] = None,
+        contains_character: Optional[str] = None,
+        min_palindrome_length: Optional[int] = None,
+        **_,
+    ) -> np.ndarray:
+        size = self._size
+        mask = np.ones(size, dtype=bool)
+        if is_palindrome is not None:
+            mask &= self._is_palindrome[:size] == is_palindrome
+        if min_length is not None:
+            mask &= self._length[:size] >= min_length
+        if max_length is not None:
+            mask &= self._length[:size] <= max_length
+        if word_count is not None:
+            mask &= self._word_count[:size] == word_count
+        if min_palindrome_length is not None:
+            mask &= self._longest_palindrome_length[:size] >= min_palindrome_length
+        if contains_character is not None:
+            char = contains_character.lower()
+            if char not in self._vocab:
+                return np.zeros(size, dtype=bool)
+            word, bit = self._bit(char)
+            mask &= (self._characters[:size, word] & bit) != 0
+        return mask
+
+    def count(self, **filters) -> int:
+        return int(np.count_nonzero(self._mask(**filters)))
+
+    def query(self, limit: Optional[int] = None, offset: int = 0, **filters) -> list[str]:
+        """
+        Return the sha256 hashes of matching strings, with the same semantics
+        and (when paginated) the same (created_at, sha256_hash) order as the
+        database filter.
+        """
+        mask = self._mask(**filters)
+        rows = np.flatnonzero(mask)
+        if limit is not None or offset:
+            end = offset + limit if limit is not None else None
+            if end is not None and end < len(rows):
+                # Only the first `end` rows need sorting: keep those created
+                # no later than the end-th smallest created_at (ties included)
+                created_at = self._created_at[rows]
+                cutoff = np.partition(created_at, end - 1)[end - 1]
+                rows = rows[created_at <= cutoff]
+            order = np.lexsort((self._hashes[rows], self._created_at[rows]))
+            rows = rows[order[offset:end]]
+        return [sha256_hash.decode() for sha256_hash in self._hashes[rows]]
+
+
+# Shared replica; only loaded (and then kept in sync by StringCRUD) when
+# config.COLUMNAR_REPLICA is enabled
+columnar_replica = ColumnarReplica()
+
+
+async def load_columnar_replica(sessions: list[AsyncSession], batch_size: int = 10_000):
+    """
+    Rebuild the shared replica from every live string on every shard.
+    """
+    columnar_replica.clear()
+    stmt = (
+        select(
+            Strings.sha256_hash,
+            Strings.value,
+            Strings.length,
+            Strings.word_count,
+            Strings.is_palindrome,
+            Strings.longest_palindrome_length,
+            Strings.created_at,
+        )
+        .where(Strings.deleted_at.is_(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for session in sessions:
+        result = await session.stream(stmt)
+        async for row in result:
+            columnar_replica.add(row)
+    columnar_replica.ready = True
+    logger.info(f"Columnar replica loaded with {len(columnar_replica)} strings.")
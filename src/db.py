@@ -1,14 +1,51 @@
+from contextlib import AsyncExitStack
 from pathlib import Path
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
 import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
 import uuid
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Config(BaseSettings):
     DATABASE_URL: str 
+    # Extra shard databases, comma-separated; DATABASE_URL is always shard 0
+    SHARD_DATABASE_URLS: str = ""
+    # Background compaction: tombstoned rows are purged every interval, in batches
+    PURGE_INTERVAL_SECONDS: float = 60
+    PURGE_BATCH_SIZE: int = 500
+    # Optional retention: strings older than this (by created_at) are expired
+    RETENTION_TTL_SECONDS: Optional[int] = None
+    # How anagram signatures are normalized; changing these requires re-ingesting
+    # (or `python -m src.migrate --recompute`)
+    ANAGRAM_CASE_SENSITIVE: bool = False
+    ANAGRAM_IGNORE_SPACES: bool = True
+    # Columns of the similarity index: 128 for ASCII, the rest are buckets
+    # shared by non-ASCII characters; memory is 4 bytes x this per string
+    SIMILARITY_DIMENSIONS: int = 256
+    # POST /strings analyzes values longer than this in worker processes,
+    # so large inputs do not block the event loop
+    ANALYSIS_INLINE_MAX_LENGTH: int = 10_000
+    ANALYSIS_WORKERS: int = 2
+    # Cache-Control max-age for GET /strings/{string_value}
+    STRING_CACHE_MAX_AGE: int = 3600
+    # GET /strings/events: per-subscriber buffer, resumable history, idle heartbeat
+    EVENTS_BUFFER_SIZE: int = 256
+    EVENTS_HISTORY_SIZE: int = 1024
+    EVENTS_HEARTBEAT_SECONDS: float = 15
+    # Admission control: concurrent requests and queued waiters per route budget
+    CHEAP_ROUTE_CONCURRENCY: int = 64
+    CHEAP_ROUTE_QUEUE_SIZE: int = 256
+    EXPENSIVE_ROUTE_CONCURRENCY: int = 4
+    EXPENSIVE_ROUTE_QUEUE_SIZE: int = 16
+    ADMISSION_TIMEOUT_SECONDS: float = 2.0
+    # Answer GET /strings and the natural-language filter from an in-memory
+    # columnar replica of the filterable columns (loaded at startup)
+    COLUMNAR_REPLICA: bool = False
+    # Most values or ids accepted by one POST /strings/lookup request
+    LOOKUP_MAX_ITEMS: int = 1000
     
     model_config = SettingsConfigDict(
         case_sensitive=False,
@@ -16,6 +53,11 @@ class Config(BaseSettings):
         env_file_encoding="utf-8",
     )
 
+    @property
+    def shard_urls(self) -> list[str]:
+        extra = [url.strip() for url in self.SHARD_DATABASE_URLS.split(",") if url.strip()]
+        return [self.DATABASE_URL, *extra]
+
 config = Config()
 
 
@@ -38,12 +80,96 @@ class Strings(BaseModel):
     word_count = sa.Column(sa.Integer, nullable=False)
     sha256_hash = sa.Column(sa.String, nullable=False)
     character_frequency_map = sa.Column(sa.JSON, nullable=False)
-    
+    anagram_signature = sa.Column(sa.String, nullable=False)
+    longest_palindrome = sa.Column(sa.String, nullable=False)
+    longest_palindrome_length = sa.Column(sa.Integer, nullable=False, index=True)
+    longest_palindrome_offset = sa.Column(sa.Integer, nullable=False)
+
+    __table_args__ = (
+        # Every read path filters out tombstones, so only live rows are indexed
+        sa.Index(
+            "ix_strings_sha256_hash_live",
+            "sha256_hash",
+            postgresql_where=sa.text("deleted_at IS NULL"),
+            sqlite_where=sa.text("deleted_at IS NULL"),
+        ),
+        sa.Index(
+            "ix_strings_anagram_signature_live",
+            "anagram_signature",
+            postgresql_where=sa.text("deleted_at IS NULL"),
+            sqlite_where=sa.text("deleted_at IS NULL"),
+        ),
+        # Lets the compaction worker find tombstones without scanning live rows
+        sa.Index(
+            "ix_strings_deleted_at",
+            "deleted_at",
+            postgresql_where=sa.text("deleted_at IS NOT NULL"),
+            sqlite_where=sa.text("deleted_at IS NOT NULL"),
+        ),
+    )
+
+class StringTrigrams(Base):
+    """
+    Posting index for substring search: one row per distinct lower-cased
+    trigram of each stored string.
+    """
+    __tablename__ = "string_trigrams"
+    trigram = sa.Column(sa.String, primary_key=True)
+    string_id = sa.Column(
+        sa.UUID, sa.ForeignKey("strings.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    __table_args__ = (
+        # The primary key leads with trigram; purges and the ON DELETE CASCADE
+        # look postings up by string_id, which needs its own index
+        sa.Index("ix_string_trigrams_string_id", "string_id"),
+    )
+
+class WriteGenerations(Base):
+    """
+    One-row counter per database, bumped in the same transaction as every
+    visible write to `strings`. Conditional GETs on filter results validate
+    against it, so writes from any process (other workers, the bulk loader)
+    invalidate cached results. The epoch changes if the database is reset.
+    """
+    __tablename__ = "write_generations"
+    id = sa.Column(sa.Integer, primary_key=True)
+    epoch = sa.Column(sa.String, nullable=False)
+    value = sa.Column(sa.BigInteger, nullable=False)
+
+def seed_generation(dialect_name: str):
+    """
+    INSERT of the write generation row that does nothing if it already
+    exists, so concurrent first writes (or startups) never collide on it.
+    """
+    values = {"id": 1, "epoch": uuid.uuid4().hex[:12], "value": 0}
+    if dialect_name == "postgresql":
+        return postgresql.insert(WriteGenerations).values(values).on_conflict_do_nothing()
+    if dialect_name == "sqlite":
+        return sqlite.insert(WriteGenerations).values(values).on_conflict_do_nothing()
+    return sa.insert(WriteGenerations).values(values)
+
 engine = create_async_engine(url= config.DATABASE_URL)
 
 async_session = async_sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False
 )
+
+# One engine and session factory per shard, shard 0 being the main database
+shard_engines = [engine] + [create_async_engine(url=url) for url in config.shard_urls[1:]]
+shard_sessions = [async_session] + [
+    async_sessionmaker(bind=shard_engine, class_=AsyncSession, expire_on_commit=False)
+    for shard_engine in shard_engines[1:]
+]
+
+
+def shard_index(sha256_hash: str, shard_count: int) -> int:
+    """
+    Shard that owns a string: its SHA-256 prefix is uniformly distributed,
+    so taking it modulo the shard count spreads rows evenly.
+    """
+    return int(sha256_hash[:8], 16) % shard_count
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     """
     Creates and yields an asynchronous database session.
@@ -64,32 +190,49 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+async def get_shard_sessions() -> AsyncGenerator[list[AsyncSession], None]:
+    """
+    Creates and yields one session per additional shard (shards 1..N-1).
+
+    Shard 0 is the session from `get_session`. When the database is not
+    sharded this yields an empty list. Sessions only connect on first use,
+    so point operations touch just the shard they are routed to.
+    """
+    async with AsyncExitStack() as stack:
+        yield [
+            await stack.enter_async_context(factory()) for factory in shard_sessions[1:]
+        ]
+
+
 async def init_db():
     """
     Initialize the database by creating all tables defined in the Base metadata.
 
-    This asynchronous function uses the SQLAlchemy engine to create all tables
-    that are defined in the Base metadata. It's typically used when setting up
+    This asynchronous function uses the SQLAlchemy engine of every shard to create
+    all tables that are defined in the Base metadata. It's typically used when setting up
     the database for the first time or after a complete reset.
 
     The function uses a connection from the engine and runs the create_all
     method synchronously within the asynchronous context.
     """
-    async with engine.begin() as conn:
-        # Use run_sync to call the synchronous create_all method in an async context
-        await conn.run_sync(Base.metadata.create_all)
-        print(Base.metadata.tables.keys())
+    for shard_engine in shard_engines:
+        async with shard_engine.begin() as conn:
+            # Use run_sync to call the synchronous create_all method in an async context
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(seed_generation(conn.dialect.name))
+    print(Base.metadata.tables.keys())
 
 async def drop_db():
     """
     Drop all tables in the database.
 
-    This asynchronous function uses the SQLAlchemy engine to drop all tables
-    that are defined in the Base metadata. It's typically used when you want
+    This asynchronous function uses the SQLAlchemy engine of every shard to drop
+    all tables that are defined in the Base metadata. It's typically used when you want
     to completely reset the database structure.
 
     Caution: This operation will delete all data in the tables. Use with care.
     """
-    async with engine.begin() as conn:
-        # Use run_sync to call the synchronous drop_all method in an async context
-        await conn.run_sync(Base.metadata.drop_all)
+    for shard_engine in shard_engines:
+        async with shard_engine.begin() as conn:
+            # Use run_sync to call the synchronous drop_all method in an async context
+            await conn.run_sync(Base.metadata.drop_all)
@@ -26,6 +26,12 @@ class AlreadyExist(BaseExceptionClass):
     pass
 
 
+class ServiceOverloaded(BaseExceptionClass):
+    def __init__(self, message: str, retry_after: int = 1):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
 def register_error_handler(app: FastAPI):
     @app.exception_handler(HTTPException)
     async def http_exception_handler(request: Request, exc: HTTPException):
@@ -73,3 +79,12 @@ def register_error_handler(app: FastAPI):
             },  # Changed to use "detail"
             status_code=status.HTTP_409_CONFLICT,
         )
+
+    @app.exception_handler(ServiceOverloaded)
+    async def service_overloaded_error_handler(request: Request, exc: ServiceOverloaded):
+        exception_logger.error(f"Service overloaded: {str(exc)}")
+        return JSONResponse(
+            content={"detail": str(exc.message) or "Service overloaded"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(exc.retry_after)},
+        )
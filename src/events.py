@@ -0,0 +1,190 @@
+import asyncio
+import json
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from src.db import config
+from src.log import setup_logger
+from src.schema import FiltersApplied
+
+# Set up logger
+logger = setup_logger(__name__, "events.log")
+
+
+@dataclass
+class StringEvent:
+    id: str
+    sequence: int
+    type: str  # "created" or "deleted"
+    data: dict  # SuccessResponse payload of the string, JSON-ready
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+
+@dataclass(eq=False)
+class Subscription:
+    filters: FiltersApplied
+    queue: asyncio.Queue
+    # Set when the subscriber fell too far behind and was cut off
+    overflowed: bool = False
+    # Replay could not cover the requested Last-Event-ID
+    missed_events: bool = False
+    # Sent with the resync event, so a reconnect resumes after the gap
+    resync_id: Optional[str] = None
+    dropped: int = 0
+
+
+def matches_filters(filters: FiltersApplied, data: dict) -> bool:
+    # Same semantics as the GET /strings filters, applied to one event payload
+    properties = data["properties"]
+    value = data["value"].lower()
+    if filters.is_palindrome is not None and properties["is_palindrome"] != filters.is_palindrome:
+        return False
+    if filters.min_length is not None and properties["length"] < filters.min_length:
+        return False
+    if filters.max_length is not None and properties["length"] > filters.max_length:
+        return False
+    if filters.word_count is not None and properties["word_count"] != filters.word_count:
+        return False
+    if filters.contains_character is not None and filters.contains_character.lower() not in value:
+        return False
+    if filters.contains is not None and filters.contains.lower() not in value:
+        return False
+    if (
+        filters.min_palindrome_length is not None
+        and properties["longest_palindrome_length"] < filters.min_palindrome_length
+    ):
+        return False
+    return True
+
+
+class EventBroker:
+    """
+    In-process fan-out of string create/delete events.
+
+    Every subscriber gets a bounded queue. Publishing never waits: a
+    subscriber whose queue is full is disconnected instead of slowing down
+    writers. Recent events are kept so a reconnecting client can resume
+    from its Last-Event-ID.
+    """
+
+    def __init__(self, buffer_size: int, history_size: int):
+        self.buffer_size = buffer_size
+        self.boot_id = uuid.uuid4().hex[:12]
+        self._sequence = 0
+        self._history: deque[StringEvent] = deque(maxlen=history_size)
+        self._subscribers: set[Subscription] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def _event_id(self, sequence: int) -> str:
+        # Scoped to this process lifetime so ids from a previous run never match
+        return f"{self.boot_id}-{sequence}"
+
+    def _deliver(self, subscription: Subscription, event: StringEvent):
+        if not matches_filters(subscription.filters, event.data):
+            return
+        try:
+            subscription.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning(f"Disconnecting slow subscriber after {self.buffer_size} buffered events.")
+            self.unsubscribe(subscription)
+            subscription.overflowed = True
+            # Make room for the sentinel that ends the subscriber's stream
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+                subscription.dropped += 1
+            subscription.queue.put_nowait(None)
+
+    def publish(self, event_type: str, data: dict) -> StringEvent:
+        self._sequence += 1
+        event = StringEvent(
+            id=self._event_id(self._sequence),
+            sequence=self._sequence,
+            type=event_type,
+            data=data,
+        )
+        self._history.append(event)
+        for subscription in list(self._subscribers):
+            self._deliver(subscription, event)
+        return event
+
+    def subscribe(
+        self, filters: FiltersApplied, last_event_id: Optional[str] = None
+    ) -> Subscription:
+        subscription = Subscription(
+            filters=filters, queue=asyncio.Queue(maxsize=self.buffer_size)
+        )
+        self._subscribers.add(subscription)
+        if last_event_id is not None:
+            self._replay(subscription, last_event_id)
+        return subscription
+
+    def _replay(self, subscription: Subscription, last_event_id: str):
+        boot_id, _, sequence = last_event_id.rpartition("-")
+        if boot_id != self.boot_id or not sequence.isdigit():
+            self._resync(subscription)
+            return
+        sequence = int(sequence)
+        first_available = self._history[0].sequence if self._history else self._sequence + 1
+        if sequence + 1 < first_available:
+            # Some events after last_event_id have already left the history
+            self._resync(subscription)
+            return
+        backlog = [
+            event
+            for event in self._history
+            if event.sequence > sequence and matches_filters(subscription.filters, event.data)
+        ]
+        if len(backlog) > self.buffer_size:
+            # Replaying would overflow the queue before the stream even starts,
+            # and the client would reconnect into the same overflow forever
+            self._resync(subscription)
+            return
+        for event in backlog:
+            subscription.queue.put_nowait(event)
+
+    def _resync(self, subscription: Subscription):
+        # The client re-queries GET /strings; everything up to now is covered by that
+        subscription.missed_events = True
+        subscription.resync_id = self._event_id(self._sequence)
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    async def stream(
+        self, subscription: Subscription, heartbeat: float = config.EVENTS_HEARTBEAT_SECONDS
+    ) -> AsyncIterator[str]:
+        """
+        Render a subscription as a text/event-stream body.
+
+        Sends a comment line every heartbeat interval while idle, and ends the
+        stream with an "overflow" event if the subscriber was disconnected for
+        falling behind.
+        """
+        try:
+            if subscription.missed_events:
+                # The client must re-query GET /strings to catch up
+                yield f"id: {subscription.resync_id}\nevent: resync\ndata: {{}}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    yield f"event: overflow\ndata: {json.dumps({'dropped': subscription.dropped})}\n\n"
+                    break
+                yield event.encode()
+        finally:
+            self.unsubscribe(subscription)
+
+
+# Shared broker, fed by StringCRUD and the compaction worker
+event_broker = EventBroker(
+    buffer_size=config.EVENTS_BUFFER_SIZE, history_size=config.EVENTS_HISTORY_SIZE
+)
@@ -0,0 +1,61 @@
+import json
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# How each dialect spells "show me the plan". PostgreSQL runs the statement
+# (ANALYZE) and reports actual row counts, timings and buffer hits as JSON;
+# SQLite has no ANALYZE variant and only reports which indexes it searches
+# and which tables it scans.
+EXPLAIN_PREFIX = {
+    "postgresql": "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+
+def render_sql(statement, dialect) -> str:
+    # Inline the bound values so the SQL can be pasted into a database shell
+    try:
+        compiled = statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    except Exception:
+        compiled = statement.compile(dialect=dialect)
+    return str(compiled)
+
+
+def _plan(dialect_name: str, rows: list) -> list | dict:
+    if dialect_name == "postgresql":
+        # One row, one column: a JSON array holding the plan tree
+        plan = rows[0][0]
+        return (json.loads(plan) if isinstance(plan, str) else plan)[0]
+    if dialect_name == "sqlite":
+        # (id, parent, notused, detail) rows, indented by depth
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return lines
+    return [" ".join(str(column) for column in row) for row in rows]
+
+
+async def explain_plan(session: AsyncSession, statement) -> dict:
+    """
+    Run the database's EXPLAIN for a SELECT on one session.
+
+    Returns:
+        dict: {"dialect": ..., "analyze": bool, "plan": ...}
+    """
+    connection = await session.connection()
+    dialect = connection.dialect
+    compiled = statement.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positional:
+        parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        parameters = compiled.params
+    result = await connection.exec_driver_sql(
+        EXPLAIN_PREFIX.get(dialect.name, "EXPLAIN ") + compiled.string, parameters
+    )
+    return {
+        "dialect": dialect.name,
+        "analyze": dialect.name == "postgresql",
+        "plan": _plan(dialect.name, result.all()),
+    }
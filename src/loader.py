@@ -0,0 +1,302 @@
+"""
+Offline bulk loader for NDJSON and CSV files.
+
+Usage:
+    python -m src.loader strings.ndjson
+    python -m src.loader strings.csv --column text --workers 8 --batch-size 5000
+
+NDJSON lines may be JSON strings or objects with a "value" field; CSV files
+need a header row. Values are analyzed by `StringService` in worker
+processes and written straight to each shard with the dialect's fastest bulk
+path: COPY on PostgreSQL, batched executemany elsewhere. Strings that are
+already stored are skipped.
+
+Progress is checkpointed after every committed batch, so rerunning the same
+command after an interruption resumes where it stopped. Running servers only
+see the new rows in their in-memory indexes after a restart.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import bump_generation
+from src.db import Strings, StringTrigrams, init_db, shard_index, shard_sessions
+from src.log import setup_logger
+from src.service import HASH_CHUNK_SIZE, analyze_string
+
+# Set up logger
+logger = setup_logger(__name__, "loader.log")
+
+STRING_COLUMNS = [column.name for column in Strings.__table__.columns]
+TRIGRAM_COLUMNS = [column.name for column in StringTrigrams.__table__.columns]
+
+
+def read_values(path: Path, file_format: str, column: str) -> Iterator[Optional[str]]:
+    """
+    Stream one value per record; malformed records yield None so that record
+    numbering (and therefore checkpoints) stays stable.
+    """
+    with open(path, newline="", encoding="utf-8") as handle:
+        if file_format == "csv":
+            for row in csv.DictReader(handle):
+                yield row.get(column)
+            return
+
+        for line in handle:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+                continue
+            yield record.get(column) if isinstance(record, dict) else record
+
+
+def analyze_batch(values: list[str]) -> list[tuple[dict, list[str]]]:
+    # Runs in a worker process: the CPU-heavy part of ingest
+    return [analyze_string(value) for value in values]
+
+
+class Checkpoint:
+    """
+    Number of source records already handled, persisted atomically as JSON.
+    """
+
+    def __init__(self, path: Path, source: Path):
+        self.path = path
+        self.source = str(source.resolve())
+        self.records = self.inserted = self.skipped = self.invalid = 0
+
+    def load(self):
+        if not self.path.exists():
+            return
+        state = json.loads(self.path.read_text())
+        if state.get("source") != self.source:
+            raise SystemExit(f"Checkpoint {self.path} belongs to {state.get('source')}")
+        self.records = state["records"]
+        self.inserted = state["inserted"]
+        self.skipped = state["skipped"]
+        self.invalid = state["invalid"]
+
+    def save(self):
+        temporary = self.path.with_suffix(self.path.suffix + ".tmp")
+        temporary.write_text(
+            json.dumps(
+                {
+                    "source": self.source,
+                    "records": self.records,
+                    "inserted": self.inserted,
+                    "skipped": self.skipped,
+                    "invalid": self.invalid,
+                }
+            )
+        )
+        os.replace(temporary, self.path)
+
+
+async def existing_hashes(session: AsyncSession, hashes: list[str]) -> set[str]:
+    # Chunked so large batches stay under the driver's bind-parameter limit
+    existing = set()
+    for start in range(0, len(hashes), HASH_CHUNK_SIZE):
+        result = await session.execute(
+            select(Strings.sha256_hash).where(
+                Strings.sha256_hash.in_(hashes[start : start + HASH_CHUNK_SIZE]),
+                Strings.deleted_at.is_(None),
+            )
+        )
+        existing.update(result.scalars().all())
+    return existing
+
+
+async def write_rows(session: AsyncSession, rows: list[dict], postings: list[dict]):
+    connection = await session.connection()
+    if connection.dialect.name == "postgresql":
+        # COPY is the fastest way into PostgreSQL; asyncpg takes json as text
+        raw = (await connection.get_raw_connection()).driver_connection
+        await raw.copy_records_to_table(
+            Strings.__tablename__,
+            columns=STRING_COLUMNS,
+            records=[
+                tuple(
+                    json.dumps(row[name]) if name == "character_frequency_map" else row[name]
+                    for name in STRING_COLUMNS
+                )
+                for row in rows
+            ],
+        )
+        await raw.copy_records_to_table(
+            StringTrigrams.__tablename__,
+            columns=TRIGRAM_COLUMNS,
+            records=[tuple(posting[name] for name in TRIGRAM_COLUMNS) for posting in postings],
+        )
+    else:
+        await connection.execute(insert(Strings.__table__), rows)
+        if not postings:
+            return
+        statement = insert(StringTrigrams.__table__).compile(dialect=connection.dialect)
+        if not statement.positional:
+            await connection.execute(insert(StringTrigrams.__table__), postings)
+            return
+        # Postings outnumber strings ~30 to 1: hand them to the driver's
+        # executemany directly, converting only the UUID column, and in key
+        # order so the primary-key B-tree is filled sequentially
+        to_db = StringTrigrams.__table__.c.string_id.type.bind_processor(connection.dialect)
+        to_db = to_db or (lambda value: value)
+        await connection.exec_driver_sql(
+            statement.string,
+            sorted((posting["trigram"], to_db(posting["string_id"])) for posting in postings),
+        )
+
+
+async def store_batch(
+    sessions: list[AsyncSession], analyzed: list[tuple[dict, list[str]]]
+) -> int:
+    """
+    Write one analyzed batch, skipping strings that are already stored.
+
+    Returns:
+        int: The number of strings inserted.
+    """
+    # Duplicates inside the batch collapse onto their first occurrence
+    unique = {}
+    for row, trigrams in analyzed:
+        unique.setdefault(row["sha256_hash"], (row, trigrams))
+
+    by_shard: dict[int, list[tuple[dict, list[str]]]] = {}
+    for sha256_hash, item in unique.items():
+        by_shard.setdefault(shard_index(sha256_hash, len(sessions)), []).append(item)
+
+    now = datetime.now(timezone.utc)
+    inserted = 0
+    for shard, items in by_shard.items():
+        session = sessions[shard]
+        stored = await existing_hashes(session, [row["sha256_hash"] for row, _ in items])
+        rows, postings = [], []
+        for row, trigrams in items:
+            if row["sha256_hash"] in stored:
+                continue
+            row = {**row, "id": uuid.uuid4(), "created_at": now, "updated_at": now, "deleted_at": None}
+            rows.append(row)
+            postings.extend({"trigram": trigram, "string_id": row["id"]} for trigram in trigrams)
+        if rows:
+            await write_rows(session, rows, postings)
+            # Invalidates filter ETags served by running servers
+            await bump_generation(session)
+            await session.commit()
+            inserted += len(rows)
+    return inserted
+
+
+async def load(
+    path: Path,
+    file_format: str,
+    column: str,
+    batch_size: int,
+    workers: int,
+    checkpoint: Checkpoint,
+):
+    await init_db()
+    checkpoint.load()
+    if checkpoint.records:
+        logger.info(f"Resuming {path} after {checkpoint.records} records.")
+
+    values = read_values(path, file_format, column)
+    # Skip what a previous run already committed
+    for _ in range(checkpoint.records):
+        next(values, None)
+
+    started = time.perf_counter()
+    processed = 0
+    loop = asyncio.get_running_loop()
+    sessions = [factory() for factory in shard_sessions]
+    # Bounded pipeline: at most two batches per worker are read ahead
+    pending: deque[tuple[int, int, asyncio.Future]] = deque()
+
+    async def commit_oldest():
+        nonlocal processed
+        consumed, invalid, future = pending.popleft()
+        analyzed = await future
+        inserted = await store_batch(sessions, analyzed)
+        checkpoint.records += consumed
+        checkpoint.inserted += inserted
+        checkpoint.skipped += len(analyzed) - inserted
+        checkpoint.invalid += invalid
+        checkpoint.save()
+        processed += consumed
+        rate = processed / (time.perf_counter() - started)
+        logger.info(
+            f"{checkpoint.records} records: {checkpoint.inserted} inserted, "
+            f"{checkpoint.skipped} duplicates skipped, {checkpoint.invalid} invalid "
+            f"({rate:,.0f} records/s)."
+        )
+
+    try:
+        # Spawned, not forked: the event loop and database drivers run threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            while True:
+                batch = [value for _, value in zip(range(batch_size), values)]
+                if not batch:
+                    break
+                valid = [value for value in batch if isinstance(value, str)]
+                future = loop.run_in_executor(pool, analyze_batch, valid)
+                pending.append((len(batch), len(batch) - len(valid), future))
+                if len(pending) >= 2 * workers:
+                    await commit_oldest()
+            while pending:
+                await commit_oldest()
+    finally:
+        for session in sessions:
+            await session.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Finished {path} in {elapsed:.1f}s: {checkpoint.inserted} inserted, "
+        f"{checkpoint.skipped} duplicates skipped, {checkpoint.invalid} invalid."
+    )
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Bulk load strings from an NDJSON or CSV file.")
+    parser.add_argument("path", type=Path, help="NDJSON (.ndjson/.jsonl) or CSV file")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="defaults to the file extension")
+    parser.add_argument("--column", default="value", help="field or CSV column holding the string")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--checkpoint", type=Path, help="defaults to <path>.checkpoint")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ("csv" if args.path.suffix.lower() == ".csv" else "ndjson")
+    checkpoint_path = args.checkpoint or args.path.with_name(args.path.name + ".checkpoint")
+    if args.restart and checkpoint_path.exists():
+        checkpoint_path.unlink()
+
+    asyncio.run(
+        load(
+            args.path,
+            file_format,
+            args.column,
+            args.batch_size,
+            args.workers,
+            Checkpoint(checkpoint_path, args.path),
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
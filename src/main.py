@@ -1,26 +1,63 @@
-from contextlib import asynccontextmanager
-from typing import Optional
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Optional, Union
 
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db import drop_db, get_session, init_db
+from src.admission import admit_cheap, admit_expensive
+from src.cache import etag_matches, filter_etag, strong_etag
+from src.columnar import load_columnar_replica
+from src.db import (
+    config,
+    drop_db,
+    get_session,
+    get_shard_sessions,
+    init_db,
+    shard_sessions,
+)
 from src.error import NotFoundError, register_error_handler
+from src.events import event_broker
 from src.schema import (
+    AnagramStrings,
     CreateResponse,
-    FilteredString,
     FiltersApplied,
-    Properties,
+    LookupRequest,
+    LookupResponse,
     StringInput,
     SuccessResponse,
     NLPFiltering, # Added for natural language filtering response
+    QueryExplanation,
+    SimilarStrings,
 )
-from src.service import StringCRUD
+from src.service import StringCRUD, shutdown_analysis_pool, string_properties
+from src.similarity import load_similarity_index
+from src.singleflight import read_coalescer
+from src.worker import compaction_worker
+
+
+def get_string_service(
+    db: AsyncSession = Depends(get_session),
+    shards: list[AsyncSession] = Depends(get_shard_sessions),
+):
+    return StringCRUD(db=db, shards=[db, *shards])
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(
+        status_code=304, headers={"ETag": etag, "Cache-Control": cache_control}
+    )
 
 
-def get_string_service(db: AsyncSession = Depends(get_session)):
-    return StringCRUD(db=db)
+def json_body(body: bytes, etag: str, cache_control: str) -> Response:
+    # Coalesced reads hand back an already-serialized body
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
 
 
 @asynccontextmanager
@@ -31,13 +68,29 @@ async def life_span(app: FastAPI):
         # print("tables dropped")
         await init_db()
         print("tables created")
+        async with AsyncExitStack() as stack:
+            sessions = [
+                await stack.enter_async_context(factory()) for factory in shard_sessions
+            ]
+            await load_similarity_index(sessions)
+            if config.COLUMNAR_REPLICA:
+                await load_columnar_replica(sessions)
     except Exception as e:
         print(f"Error during database initialization: {str(e)}")
         raise
 
+    # Purge tombstones (and expire old strings, if a TTL is set) in the background
+    worker = asyncio.create_task(compaction_worker())
+
     yield  # Application is running
 
     # Shutdown
+    worker.cancel()
+    try:
+        await worker
+    except asyncio.CancelledError:
+        pass
+    shutdown_analysis_pool()
     print("server is ending.....")
 
 
@@ -56,21 +109,14 @@ app.add_middleware(
 )
 
 
-@app.post("/strings", status_code=201)
+@app.post("/strings", status_code=201, dependencies=[Depends(admit_cheap)])
 async def create_analyze_string(
     string_input: StringInput, string_crud: StringCRUD = Depends(get_string_service)
 ):
     # takes the string and does the service computation, returns the necccessary values
     validated_str = string_input.value
     new_str = await string_crud.create_string(validated_str)
-    properties = Properties(
-        length=new_str.length,
-        is_palindrome=new_str.is_palindrome,
-        unique_characters=new_str.unique_characters,
-        word_count=new_str.word_count,
-        sha256_hash=new_str.sha256_hash,
-        character_frequency_map=new_str.character_frequency_map,
-    )
+    properties = string_properties(new_str)
     response = CreateResponse(
         id=new_str.sha256_hash,
         value=new_str.value,
@@ -80,71 +126,100 @@ async def create_analyze_string(
     return response.model_dump()
 
 
-@app.get("/strings/filter-by-natural-language", response_model=NLPFiltering)
-async def filter_strings_by_query(
-    query: str, string_crud: StringCRUD = Depends(get_string_service)
+@app.post(
+    "/strings/lookup",
+    response_model=LookupResponse,
+    dependencies=[Depends(admit_expensive)],
+)
+# Look Up Many Strings by Value or ID
+async def lookup_strings(
+    lookup: LookupRequest,
+    string_crud: StringCRUD = Depends(get_string_service),
 ):
-    return await string_crud.filter_strings_by_natural_language(query=query)
-
+    items = lookup.values if lookup.values is not None else lookup.ids
+    if len(items) > config.LOOKUP_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.LOOKUP_MAX_ITEMS} values or ids per request.",
+        )
+    return await string_crud.lookup_strings(values=lookup.values, ids=lookup.ids)
 
 
-@app.get("/strings/{string_value}")
-# Get Specific String
-async def get_string(
-    string_value: str,
+@app.get(
+    "/strings/filter-by-natural-language",
+    response_model=Union[NLPFiltering, QueryExplanation],
+    dependencies=[Depends(admit_expensive)],
+)
+async def filter_strings_by_query(
+    query: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    explain: bool = False,
     string_crud: StringCRUD = Depends(get_string_service),
 ):
-    string = await string_crud.fetch_one_string(
-        string_value=string_value,
-    )
-    properties = Properties(
-        length=string.length,
-        is_palindrome=string.is_palindrome,
-        unique_characters=string.unique_characters,
-        word_count=string.word_count,
-        sha256_hash=string.sha256_hash,
-        character_frequency_map=string.character_frequency_map,
-    )
-    response = CreateResponse(
-        id=string.sha256_hash,
-        value=string.value,
-        properties=properties,
-        created_at=string.created_at,
-    ) 
-    return response.model_dump()
+    if explain:
+        explanation = await string_crud.explain_filtering(
+            query=query, limit=limit, offset=offset
+        )
+        return explanation.model_dump()
 
+    # Results only change when a write bumps a shard's generation
+    etag = filter_etag(await string_crud.write_generations())
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return not_modified(etag, "no-cache")
 
+    body = await string_crud.natural_language_response(
+        query=query, etag=etag, limit=limit, offset=offset
+    )
+    return json_body(body, etag, "no-cache")
 
 
-# IMPORTANT: /strings route MUST come BEFORE /strings/{string_value}
-@app.get("/strings")
-# Get All Strings with Filtering
-async def query_strings(
+
+@app.get("/strings/events")
+# Stream Created/Deleted String Events (Server-Sent Events)
+async def stream_string_events(
+    request: Request,
     is_palindrome: Optional[bool] = None,
     min_length: Optional[int] = None,
     max_length: Optional[int] = None,
     word_count: Optional[int] = None,
     contains_character: Optional[str] = None,
-    string_crud: StringCRUD = Depends(get_string_service),
+    contains: Optional[str] = None,
+    min_palindrome_length: Optional[int] = None,
+    last_event_id: Optional[str] = None,
 ):
-    strings = await string_crud.fetch_all_strings_with_filtering(
+    filters = FiltersApplied(
         is_palindrome=is_palindrome,
         min_length=min_length,
         max_length=max_length,
         word_count=word_count,
         contains_character=contains_character,
+        contains=contains,
+        min_palindrome_length=min_palindrome_length,
+    )
+    # EventSource sends Last-Event-ID on reconnect; the query parameter is for other clients
+    subscription = event_broker.subscribe(
+        filters, last_event_id=request.headers.get("Last-Event-ID") or last_event_id
     )
+    return StreamingResponse(
+        event_broker.stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/strings/{string_value}/anagrams", dependencies=[Depends(admit_cheap)])
+# Get Stored Anagrams of a String
+async def get_anagrams(
+    string_value: str,
+    string_crud: StringCRUD = Depends(get_string_service),
+):
+    signature, strings = await string_crud.fetch_anagrams(string_value=string_value)
 
     response_data = []
     for string in strings:
-        properties = Properties(
-            length=string.length,
-            is_palindrome=string.is_palindrome,
-            unique_characters=string.unique_characters,
-            word_count=string.word_count,
-            sha256_hash=string.sha256_hash,
-            character_frequency_map=string.character_frequency_map,
-        )
+        properties = string_properties(string)
         response_data.append(
             SuccessResponse(
                 id=string.sha256_hash,
@@ -154,24 +229,95 @@ async def query_strings(
             )
         )
 
+    return AnagramStrings(
+        data=response_data, count=len(response_data), signature=signature
+    ).model_dump()
+
+
+@app.get(
+    "/strings/{string_value}/similar",
+    response_model=SimilarStrings,
+    dependencies=[Depends(admit_expensive)],
+)
+# Get Stored Strings with the Closest Character Composition
+async def get_similar_strings(
+    string_value: str,
+    k: int = Query(10, ge=1, le=1000),
+    string_crud: StringCRUD = Depends(get_string_service),
+):
+    return await string_crud.find_similar_strings(string_value=string_value, k=k)
+
+
+@app.get("/strings/{string_value}", dependencies=[Depends(admit_cheap)])
+# Get Specific String
+async def get_string(
+    string_value: str,
+    request: Request,
+    string_crud: StringCRUD = Depends(get_string_service),
+):
+    # The ETag is the string's own hash, so it is known before any query
+    sha256_hash = string_crud.string_service.sha256_hash(string_value)
+    etag = strong_etag(sha256_hash)
+    cache_control = f"public, max-age={config.STRING_CACHE_MAX_AGE}, immutable"
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        # Still current only if no process has deleted it since
+        if await string_crud.is_live(sha256_hash):
+            return not_modified(etag, cache_control)
+
+    body = await string_crud.string_response(string_value=string_value)
+    return json_body(body, etag, cache_control)
+
+
+
+
+# IMPORTANT: /strings route MUST come BEFORE /strings/{string_value}
+@app.get("/strings", dependencies=[Depends(admit_expensive)])
+# Get All Strings with Filtering
+async def query_strings(
+    request: Request,
+    is_palindrome: Optional[bool] = None,
+    min_length: Optional[int] = None,
+    max_length: Optional[int] = None,
+    word_count: Optional[int] = None,
+    contains_character: Optional[str] = None,
+    contains: Optional[str] = None,
+    min_palindrome_length: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    explain: bool = False,
+    string_crud: StringCRUD = Depends(get_string_service),
+):
     filters_applied = FiltersApplied(
         is_palindrome=is_palindrome,
         min_length=min_length,
         max_length=max_length,
         word_count=word_count,
         contains_character=contains_character,
+        contains=contains,
+        min_palindrome_length=min_palindrome_length,
     )
+    if explain:
+        explanation = await string_crud.explain_filtering(
+            filters=filters_applied, limit=limit, offset=offset
+        )
+        return explanation.model_dump()
 
-    return FilteredString(
-        data=response_data, count=len(response_data), filters_applied=filters_applied
-    ).model_dump()
+    # Results only change when a write bumps a shard's generation
+    etag = filter_etag(await string_crud.write_generations())
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return not_modified(etag, "no-cache")
+
+    body = await string_crud.filtered_strings_response(
+        filters_applied, etag=etag, limit=limit, offset=offset
+    )
+    return json_body(body, etag, "no-cache")
 
 
 
 
 
 
-@app.delete("/strings/{string_value}")
+@app.delete("/strings/{string_value}", dependencies=[Depends(admit_cheap)])
 async def delete_string(
     string_value: str, string_crud: StringCRUD = Depends(get_string_service)
 ):
@@ -182,8 +328,15 @@ async def delete_string(
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@app.get("/metrics/coalescing")
+# Single-Flight Read Coalescing Counters
+async def coalescing_metrics():
+    return read_coalescer.metrics()
+
+
 # Example Queries to Support:
 # "all single word palindromic strings" → word_count=1, is_palindrome=true
 # "strings longer than 10 characters" → min_length=11
 # "palindromic strings that contain the first vowel" → is_palindrome=true, contains_character=a (or similar heuristic)
 # "strings containing the letter z" → contains_character=z
+# "strings containing 'abc'" → contains=abc
@@ -0,0 +1,162 @@
+"""
+Offline upgrade of databases created before the derived string columns.
+
+Usage:
+    python -m src.migrate
+    python -m src.migrate --recompute
+
+`init_db` only creates missing tables; it never alters `strings`. This adds
+the anagram signature and longest-palindrome columns, the trigram posting
+table and every index the models declare, then backfills the new columns and
+the postings of existing rows in batches, on every shard. Rerunning it is
+safe: only rows that are still missing something are analyzed again.
+
+`--recompute` re-analyzes every row instead, which is what changing
+ANAGRAM_CASE_SENSITIVE or ANAGRAM_IGNORE_SPACES requires. Stop the API
+servers first, or restart them afterwards: their in-memory indexes are only
+rebuilt at startup.
+"""
+import argparse
+import asyncio
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.cache import bump_generation
+from src.db import Base, Strings, StringTrigrams, seed_generation, shard_engines
+from src.log import setup_logger
+from src.service import HASH_CHUNK_SIZE, analyze_string
+
+# Set up logger
+logger = setup_logger(__name__, "migrate.log")
+
+# Columns added to `strings` after its first release, filled from `value`
+DERIVED_COLUMNS = [
+    "anagram_signature",
+    "longest_palindrome",
+    "longest_palindrome_length",
+    "longest_palindrome_offset",
+]
+
+
+def upgrade_schema(connection) -> list[str]:
+    """
+    Bring one shard's schema up to the models. Runs synchronously (through
+    `run_sync`) and returns the names of the columns it added.
+    """
+    # New tables, with their indexes; existing tables are left alone
+    Base.metadata.create_all(connection)
+    existing = {column["name"] for column in sa.inspect(connection).get_columns("strings")}
+    added = [name for name in DERIVED_COLUMNS if name not in existing]
+    for name in added:
+        column_type = Strings.__table__.c[name].type.compile(connection.dialect)
+        # Nullable until the backfill has filled in the existing rows
+        connection.execute(sa.text(f"ALTER TABLE strings ADD COLUMN {name} {column_type}"))
+    for table in (Strings.__table__, StringTrigrams.__table__):
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    return added
+
+
+async def backfill(session: AsyncSession, batch_size: int, recompute: bool = False) -> int:
+    """
+    Fill in the derived columns and trigram postings of existing rows, one
+    committed batch at a time in primary key order.
+
+    Returns:
+        int: The number of rows analyzed.
+    """
+    analyzed = 0
+    last_id = None
+    while True:
+        stmt = (
+            select(Strings.id, Strings.value, Strings.anagram_signature, Strings.longest_palindrome)
+            .order_by(Strings.id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            stmt = stmt.where(Strings.id > last_id)
+        rows = (await session.execute(stmt)).all()
+        if not rows:
+            return analyzed
+        last_id = rows[-1].id
+
+        indexed = set(
+            (
+                await session.execute(
+                    select(StringTrigrams.string_id)
+                    .where(StringTrigrams.string_id.in_([row.id for row in rows]))
+                    .distinct()
+                )
+            ).scalars()
+        )
+        updates, postings = [], []
+        for row in rows:
+            stale = recompute or row.anagram_signature is None or row.longest_palindrome is None
+            # Values shorter than a trigram legitimately have no postings
+            unindexed = row.id not in indexed and len(row.value) >= 3
+            if not (stale or unindexed):
+                continue
+            columns, trigrams = analyze_string(row.value)
+            analyzed += 1
+            if stale:
+                updates.append({"id": row.id, **{name: columns[name] for name in DERIVED_COLUMNS}})
+            if unindexed:
+                postings.extend({"trigram": trigram, "string_id": row.id} for trigram in trigrams)
+        if updates:
+            await session.execute(update(Strings), updates)
+        if postings:
+            await session.execute(insert(StringTrigrams), postings)
+        if updates or postings:
+            # Palindrome lengths and postings feed the filters: invalidate their ETags
+            await bump_generation(session)
+        await session.commit()
+        logger.info(f"Backfilled {analyzed} strings so far.")
+
+
+async def migrate(engine: AsyncEngine, batch_size: int = HASH_CHUNK_SIZE, recompute: bool = False) -> int:
+    """
+    Upgrade and backfill one shard.
+
+    Returns:
+        int: The number of rows analyzed.
+    """
+    async with engine.begin() as conn:
+        added = await conn.run_sync(upgrade_schema)
+        await conn.execute(seed_generation(conn.dialect.name))
+    if added:
+        logger.info(f"Added columns {', '.join(added)} to {engine.url.render_as_string()}.")
+
+    async with AsyncSession(bind=engine, expire_on_commit=False) as session:
+        analyzed = await backfill(session, batch_size, recompute)
+
+    if engine.dialect.name == "postgresql":
+        # Every row has its values now; SQLite cannot add the constraint later
+        async with engine.begin() as conn:
+            for name in DERIVED_COLUMNS:
+                await conn.execute(sa.text(f"ALTER TABLE strings ALTER COLUMN {name} SET NOT NULL"))
+    return analyzed
+
+
+async def migrate_all(batch_size: int, recompute: bool):
+    for shard, shard_engine in enumerate(shard_engines):
+        analyzed = await migrate(shard_engine, batch_size, recompute)
+        logger.info(f"Shard {shard}: analyzed {analyzed} strings.")
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Add and backfill derived string columns.")
+    parser.add_argument("--batch-size", type=int, default=HASH_CHUNK_SIZE)
+    parser.add_argument(
+        "--recompute",
+        action="store_true",
+        help="re-analyze every row, e.g. after changing ANAGRAM_* settings",
+    )
+    args = parser.parse_args(argv)
+    asyncio.run(migrate_all(args.batch_size, args.recompute))
+
+
+if __name__ == "__main__":
+    main()
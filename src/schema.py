@@ -1,7 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
+from pydantic_core import PydanticCustomError
 from datetime import datetime
 from typing import Dict
-from typing import Optional
+from typing import Optional, Union
 
 class StringInput(BaseModel):
     value:str
@@ -14,6 +15,9 @@ class Properties(BaseModel):
     word_count: int
     sha256_hash: str
     character_frequency_map: Dict[str, int]
+    longest_palindrome: str
+    longest_palindrome_length: int
+    longest_palindrome_offset: int
 
 class CreateResponse(BaseModel): #for 201 create
     id: str
@@ -34,6 +38,8 @@ class FiltersApplied(BaseModel):
     max_length: Optional[int] = None
     word_count: Optional[int] = None
     contains_character: Optional[str] = None
+    contains: Optional[str] = None
+    min_palindrome_length: Optional[int] = None
 
 class FilteredString(BaseModel): #Get All Strings with Filtering
     data: list[SuccessResponse]
@@ -41,12 +47,19 @@ class FilteredString(BaseModel): #Get All Strings with Filtering
     filters_applied: FiltersApplied
 
 
+class AnagramStrings(BaseModel): #Get Anagrams of a String
+    data: list[SuccessResponse]
+    count: int
+    signature: str
+
+
 class ParsedFilters(BaseModel):
     word_count: Optional[int] = None
     is_palindrome: Optional[bool] = None
     min_length: Optional[int] = None
     max_length: Optional[int] = None
     contains_character: Optional[str] = None
+    contains: Optional[str] = None
 
 class InterpretedQuery(BaseModel):
     original: str
@@ -55,4 +68,68 @@ class InterpretedQuery(BaseModel):
 class NLPFiltering(BaseModel): 
     data: list[SuccessResponse]
     count: int
-    interpreted_query: InterpretedQuery
\ No newline at end of file
+    interpreted_query: InterpretedQuery
+
+
+class SimilarString(BaseModel):
+    id: str
+    value: str
+    score: float  # cosine similarity of the character-frequency vectors
+
+class SimilarStrings(BaseModel): #Get Strings Similar to a Query String
+    data: list[SimilarString]
+    count: int
+    query: str
+
+
+class ShardExplanation(BaseModel):
+    shard: int
+    rows: int  # rows this shard sent back before the merge
+    queries: int = 1  # statements sent (by-hash fetches are chunked)
+    query_ms: float
+    hydration_ms: float
+    dialect: str
+    analyze: bool  # True when the plan comes from EXPLAIN ANALYZE
+    plan: Union[dict, list]
+
+class RowCounts(BaseModel):
+    matched: int  # rows matching the filters, ignoring limit and offset
+    fetched: int  # rows read from all shards
+    returned: int  # rows left after pagination
+
+class TimingBreakdown(BaseModel): # milliseconds
+    parse: float
+    mask: Optional[float] = None  # columnar replica only
+    query: float  # slowest shard, shards are queried concurrently
+    hydration: float
+    serialization: float
+    total: float
+
+class QueryExplanation(BaseModel): #explain=true on the filter routes
+    query: Optional[str] = None  # natural-language query, if any
+    filters_applied: FiltersApplied
+    limit: Optional[int] = None
+    offset: int = 0
+    source: str = "database"  # or "columnar_replica"
+    hashes: Optional[int] = None  # page hashes the replica's mask selected
+    sql: str  # every statement sent, separated by ";"
+    row_counts: RowCounts
+    timings_ms: TimingBreakdown
+    shards: list[ShardExplanation]
+
+
+class LookupRequest(BaseModel): #Look Up Many Strings at Once
+    values: Optional[list[str]] = None  # at most config.LOOKUP_MAX_ITEMS, checked by the route
+    ids: Optional[list[str]] = None  # sha256 hashes
+
+    @model_validator(mode="after")
+    def exactly_one_list(self):
+        if (self.values is None) == (self.ids is None):
+            # A custom error keeps the error context JSON-serializable
+            raise PydanticCustomError("lookup_input", "Provide exactly one of 'values' or 'ids'.")
+        return self
+
+class LookupResponse(BaseModel):
+    data: list[SuccessResponse]  # found strings, in input order
+    count: int
+    misses: list[str]  # inputs with no stored string, in input order
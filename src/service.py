@@ -1,16 +1,53 @@
+import asyncio
 import hashlib
-
-from sqlalchemy import select
+import heapq
+import multiprocessing
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
+from itertools import islice
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import and_, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db import Strings
+from src.cache import bump_generation, read_generation
+from src.columnar import columnar_replica
+from src.db import Strings, StringTrigrams, config, shard_index
 from src.error import AlreadyExist, NotFoundError
+from src.events import event_broker
+from src.explain import explain_plan, render_sql
 from src.log import setup_logger
-from src.schema import ParsedFilters, InterpretedQuery, NLPFiltering, SuccessResponse
+from src.schema import (
+    CreateResponse,
+    FilteredString,
+    FiltersApplied,
+    InterpretedQuery,
+    LookupResponse,
+    NLPFiltering,
+    ParsedFilters,
+    Properties,
+    QueryExplanation,
+    RowCounts,
+    ShardExplanation,
+    SimilarString,
+    SimilarStrings,
+    SuccessResponse,
+    TimingBreakdown,
+)
+from src.similarity import similarity_index
+from src.singleflight import read_coalescer
 
 # Set up logger
 logger = setup_logger(__name__, "service.log")
 
+# Hashes per IN (...) query when fetching rows by hash, well under the bound
+# parameter limits of SQLite and asyncpg
+HASH_CHUNK_SIZE = 500
+
+SHA256_HEX = re.compile(r"[0-9a-fA-F]{64}")
+
 
 class NaturalLanguageParser:
     def parse_query(self, query: str) -> ParsedFilters:
@@ -43,19 +80,25 @@ class NaturalLanguageParser:
             except (ValueError, IndexError):
                 logger.warning(f"Could not parse max_length from query: {query}")
 
-        # Basic contains character parsing (e.g., "contains 'a'")
-        logger.info(f'Checking for "contains \'" in {query_lower!r}: {"contains \'" in query_lower}')
-
-        if "contains '" in query_lower:
-            try:
-                start_index = query_lower.find("contains '") + len("contains '")
-                end_index = query_lower.find("'", start_index)
-                if start_index != -1 and end_index != -1:
-                    parsed_filters.contains_character = query_lower[start_index:end_index]
-                    logger.info(f"Parsed contains_character (with quotes): {parsed_filters.contains_character}") # DEBUG
-            except (ValueError, IndexError):
-                logger.warning(f"Could not parse contains_character from query (with quotes): {query}")
-        # Removed the 'elif "contains" in query_lower:' block for now to simplify debugging.
+        # Quoted contains parsing (e.g., "contains 'a'", "strings containing 'abc'").
+        # A single quoted character is a contains_character filter, anything
+        # longer is a substring (contains) filter.
+        for marker in ("contains '", "containing '"):
+            start_index = query_lower.find(marker)
+            if start_index == -1:
+                continue
+            start_index += len(marker)
+            end_index = query_lower.find("'", start_index)
+            if end_index == -1:
+                logger.warning(f"Could not parse contains from query (unclosed quote): {query}")
+                break
+            quoted = query_lower[start_index:end_index]
+            if len(quoted) == 1:
+                parsed_filters.contains_character = quoted
+            else:
+                parsed_filters.contains = quoted
+            logger.info(f"Parsed quoted contains filter: {quoted!r}") # DEBUG
+            break
 
         logger.info(f"Final Parsed filters before return: {parsed_filters.model_dump_json()}") # DEBUG
         return parsed_filters
@@ -80,6 +123,44 @@ class StringService:
         reversed_text = "".join(reversed(value_lower))
         return value_lower == reversed_text
 
+    def longest_palindrome(self, value: str) -> tuple[str, int, int]:
+        """
+        Longest palindromic substring (case-insensitive, like is_palindrome),
+        found in O(n) with Manacher's algorithm.
+
+        Returns:
+            tuple[str, int, int]: The substring (original casing), its length
+            and its offset in the string. Ties resolve to the leftmost match.
+        """
+        if not value:
+            return "", 0, 0
+
+        # Interleave separators so odd and even palindromes are both centred
+        # on a position; the radius at a position is then the palindrome length
+        chars = [None] * (2 * len(value) + 1)
+        chars[1::2] = [ch.lower() for ch in value]
+        size = len(chars)
+        radii = [0] * size
+        center = right = 0
+        best = 0
+        for i in range(size):
+            radius = min(right - i, radii[2 * center - i]) if i < right else 0
+            while (
+                i - radius > 0
+                and i + radius + 1 < size
+                and chars[i - radius - 1] == chars[i + radius + 1]
+            ):
+                radius += 1
+            radii[i] = radius
+            if i + radius > right:
+                center, right = i, i + radius
+            if radius > radii[best]:
+                best = i
+
+        length = radii[best]
+        offset = (best - length) // 2
+        return value[offset : offset + length], length, offset
+
     def unique_characters(self, value: str):
         # Count of distinct characters in the string
         unique_characters = set(value.replace(" ", ""))  # ignore spaces
@@ -113,6 +194,42 @@ class StringService:
             char_map[char] = char_map.get(char, 0) + 1
         return char_map
 
+    def anagram_signature(self, value: str) -> str:
+        """
+        Canonical sorted-character signature; two strings are anagrams iff
+        their signatures are equal. Case and whitespace handling follow
+        ANAGRAM_CASE_SENSITIVE and ANAGRAM_IGNORE_SPACES.
+        """
+        if not config.ANAGRAM_CASE_SENSITIVE:
+            value = value.lower()
+        if config.ANAGRAM_IGNORE_SPACES:
+            value = "".join(ch for ch in value if not ch.isspace())
+        return "".join(sorted(value))
+
+    def trigrams(self, value: str) -> set[str]:
+        # Distinct lower-cased 3-character windows, used by the substring index
+        value = value.lower()
+        return {value[i : i + 3] for i in range(len(value) - 2)}
+
+    def analyze(self, value: str) -> dict:
+        """
+        Compute every stored property of a string, keyed by `Strings` column.
+        """
+        palindrome, palindrome_length, palindrome_offset = self.longest_palindrome(value)
+        return {
+            "value": value,
+            "length": self.length(value),
+            "is_palindrome": self.is_palindrome(value),
+            "unique_characters": self.unique_characters(value),
+            "word_count": self.word_count(value),
+            "sha256_hash": self.sha256_hash(value),
+            "character_frequency_map": self.character_frequency_map(value),
+            "anagram_signature": self.anagram_signature(value),
+            "longest_palindrome": palindrome,
+            "longest_palindrome_length": palindrome_length,
+            "longest_palindrome_offset": palindrome_offset,
+        }
+
     def create_string(self, value: str):
         pass
 
@@ -121,14 +238,200 @@ class StringService:
 string_service = StringService()
 
 
+def analyze_string(value: str) -> tuple[dict, list[str]]:
+    """
+    Every stored column of a string plus its sorted trigram postings.
+
+    Module-level so it can run in a worker process: the API offloads large
+    values to `analysis_pool`, the bulk loader runs whole batches there.
+    """
+    return string_service.analyze(value), sorted(string_service.trigrams(value))
+
+
+_analysis_pool: Optional[ProcessPoolExecutor] = None
+
+
+def analysis_pool() -> ProcessPoolExecutor:
+    # Started on first use, so small deployments never pay for the processes
+    global _analysis_pool
+    if _analysis_pool is None:
+        _analysis_pool = ProcessPoolExecutor(
+            max_workers=config.ANALYSIS_WORKERS,
+            # Spawned, not forked: the event loop and database drivers run threads
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _analysis_pool
+
+
+def shutdown_analysis_pool():
+    global _analysis_pool
+    if _analysis_pool is not None:
+        _analysis_pool.shutdown(cancel_futures=True)
+        _analysis_pool = None
+
+
+async def analyze_off_loop(value: str) -> tuple[dict, list[str]]:
+    # Analysis is pure-Python and linear in the input (about 3 s/MB), so
+    # anything but small values would stall every other request on the loop
+    if len(value) <= config.ANALYSIS_INLINE_MAX_LENGTH:
+        return analyze_string(value)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(analysis_pool(), analyze_string, value)
+
+
+def string_properties(string: Strings) -> Properties:
+    # Properties block shared by every response that returns a stored string
+    return Properties(
+        length=string.length,
+        is_palindrome=string.is_palindrome,
+        unique_characters=string.unique_characters,
+        word_count=string.word_count,
+        sha256_hash=string.sha256_hash,
+        character_frequency_map=string.character_frequency_map,
+        longest_palindrome=string.longest_palindrome,
+        longest_palindrome_length=string.longest_palindrome_length,
+        longest_palindrome_offset=string.longest_palindrome_offset,
+    )
+
+
+def success_response(string: Strings) -> SuccessResponse:
+    return SuccessResponse(
+        id=string.sha256_hash,
+        value=string.value,
+        properties=string_properties(string),
+        created_at=string.created_at,
+    )
+
+
+def _event_payload(string: Strings) -> dict:
+    return success_response(string).model_dump(mode="json")
+
+
+def on_string_created(string: Strings):
+    # Keep in-process derived state in step with a committed insert
+    similarity_index.add(string.sha256_hash, string.value, string.character_frequency_map)
+    if columnar_replica.ready:
+        columnar_replica.add(string)
+    event_broker.publish("created", _event_payload(string))
+
+
+def on_string_deleted(string: Strings):
+    # Keep in-process derived state in step with a committed tombstone
+    similarity_index.remove(string.sha256_hash)
+    columnar_replica.remove(string.sha256_hash)
+    event_broker.publish("deleted", _event_payload(string))
+
+
 class StringCRUD:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, shards: list[AsyncSession] = None):
         self.string_service = StringService()
         self.db = db
+        # Shard 0 is always `db`; a single-element list means no sharding
+        self.shards = shards or [db]
+
+    def _shard(self, sha256_hash: str) -> AsyncSession:
+        # Point operations go to the one shard that owns the hash
+        return self.shards[shard_index(sha256_hash, len(self.shards))]
+
+    def _shard_statement(self, stmt, limit: int = None, offset: int = 0):
+        # Paginated reads are ordered by (created_at, sha256_hash); with more
+        # than one shard each returns its first offset + limit rows
+        if limit is None and not offset:
+            return stmt
+        stmt = stmt.order_by(Strings.created_at, Strings.sha256_hash)
+        if len(self.shards) == 1:
+            return stmt.offset(offset).limit(limit)
+        if limit is not None:
+            return stmt.limit(offset + limit)
+        return stmt
+
+    def _merge(self, shard_rows: list[list[Strings]], limit: int = None, offset: int = 0):
+        if len(shard_rows) == 1:
+            return shard_rows[0]
+        if limit is None and not offset:
+            return [string for rows in shard_rows for string in rows]
+
+        merged = heapq.merge(*shard_rows, key=lambda s: (s.created_at, s.sha256_hash))
+        end = offset + limit if limit is not None else None
+        return list(islice(merged, offset, end))
+
+    async def _scatter(self, stmt, limit: int = None, offset: int = 0) -> list[Strings]:
+        """
+        Run a read on every shard concurrently and merge the rows.
+
+        Unpaginated reads are simply concatenated. Paginated reads are ordered
+        by (created_at, sha256_hash): each shard returns its first
+        offset + limit rows and the sorted runs are merged before slicing.
+        """
+        stmt = self._shard_statement(stmt, limit=limit, offset=offset)
+        results = await asyncio.gather(*(session.execute(stmt) for session in self.shards))
+        return self._merge(
+            [result.scalars().all() for result in results], limit=limit, offset=offset
+        )
+
+    def _hash_statements(self, hashes: list[str]) -> dict[int, list]:
+        # Live rows for a batch of hashes: chunked IN queries on the hash
+        # index, each shard queried for only the hashes it owns
+        by_shard: dict[int, list[str]] = {}
+        for sha256_hash in hashes:
+            by_shard.setdefault(shard_index(sha256_hash, len(self.shards)), []).append(sha256_hash)
+        return {
+            shard: [
+                select(Strings).where(
+                    Strings.sha256_hash.in_(shard_hashes[start : start + HASH_CHUNK_SIZE]),
+                    Strings.deleted_at.is_(None),
+                )
+                for start in range(0, len(shard_hashes), HASH_CHUNK_SIZE)
+            ]
+            for shard, shard_hashes in by_shard.items()
+        }
+
+    async def _fetch_by_hashes(self, hashes: list[str]) -> dict[str, Strings]:
+        async def fetch(session: AsyncSession, statements: list) -> list[Strings]:
+            strings = []
+            for stmt in statements:
+                strings.extend((await session.execute(stmt)).scalars().all())
+            return strings
+
+        results = await asyncio.gather(
+            *(
+                fetch(self.shards[shard], statements)
+                for shard, statements in self._hash_statements(hashes).items()
+            )
+        )
+        return {string.sha256_hash: string for strings in results for string in strings}
+
+    async def _filter(self, filters: dict, limit: int = None, offset: int = 0) -> list[Strings]:
+        # With the columnar replica loaded, the mask is computed in memory and
+        # only the requested page is read from the database
+        if columnar_replica.ready and columnar_replica.supports(**filters):
+            hashes = columnar_replica.query(**filters, limit=limit, offset=offset)
+            found = await self._fetch_by_hashes(hashes)
+            # A string deleted since the mask was computed is simply left out
+            return [found[sha256_hash] for sha256_hash in hashes if sha256_hash in found]
+
+        stmt = self._filter_statement(**filters)
+        return await self._scatter(stmt, limit=limit, offset=offset)
+
+    async def write_generations(self) -> list[str]:
+        # Persisted generation of every shard; read before the query it validates
+        return list(await asyncio.gather(*(read_generation(session) for session in self.shards)))
+
+    async def is_live(self, sha256_hash: str) -> bool:
+        # Index-only probe, cheaper than loading and serializing the row
+        result = await self._shard(sha256_hash).execute(
+            select(Strings.sha256_hash)
+            .where(Strings.sha256_hash == sha256_hash, Strings.deleted_at.is_(None))
+            .limit(1)
+        )
+        return result.first() is not None
 
     async def check_if_string_exist(self, string_value: str):
-        stmt = select(Strings).where(Strings.value == string_value)
-        result = await self.db.execute(stmt)
+        sha256_hash = self.string_service.sha256_hash(string_value)
+        stmt = select(Strings).where(
+            Strings.sha256_hash == sha256_hash, Strings.deleted_at.is_(None)
+        )
+        result = await self._shard(sha256_hash).execute(stmt)
         string = result.scalars().first()
         if string:
             logger.info(f"String '{string_value}' found in database.")
@@ -146,24 +449,20 @@ class StringCRUD:
                 raise AlreadyExist(f"'{string_value}' already exists")
 
             logger.info(f"Calculating properties for new string: '{string_value}'.")
-            length = self.string_service.length(string_value)
-            is_palindrome = self.string_service.is_palindrome(string_value)
-            unique_character = self.string_service.unique_characters(string_value)
-            word_count = self.string_service.word_count(string_value)
-            hash = self.string_service.sha256_hash(string_value)
-            freq_map = self.string_service.character_frequency_map(string_value)
-
-            new_string = Strings(
-                value=string_value,
-                length=length,
-                is_palindrome=is_palindrome,
-                unique_characters=unique_character,
-                word_count=word_count,
-                sha256_hash=hash,
-                character_frequency_map=freq_map,
-            )
-            self.db.add(new_string)
-            await self.db.commit()
+            columns, trigrams = await analyze_off_loop(string_value)
+            new_string = Strings(**columns)
+            session = self._shard(new_string.sha256_hash)
+            session.add(new_string)
+            await session.flush()
+            # Postings for the substring index, written in the same transaction
+            postings = [
+                {"trigram": trigram, "string_id": new_string.id} for trigram in trigrams
+            ]
+            if postings:
+                await session.execute(insert(StringTrigrams), postings)
+            await bump_generation(session)
+            await session.commit()
+            on_string_created(new_string)
             logger.info(f"New string '{new_string.value}' created successfully.")
             return new_string
         except AlreadyExist as e:
@@ -180,9 +479,12 @@ class StringCRUD:
         string_value: str,
     ):
         logger.info(f"Fetching string '{string_value}'.")
-        stmt = select(Strings).where(Strings.value == string_value)
+        sha256_hash = self.string_service.sha256_hash(string_value)
+        stmt = select(Strings).where(
+            Strings.sha256_hash == sha256_hash, Strings.deleted_at.is_(None)
+        )
 
-        result = await self.db.execute(stmt)
+        result = await self._shard(sha256_hash).execute(stmt)
         string = result.scalars().first()
 
         if string:
@@ -197,18 +499,33 @@ class StringCRUD:
             )
 
 
-    async def fetch_all_strings_with_filtering(
+    def _substring_clause(self, substring: str):
+        # Narrow to candidates holding every trigram of the substring via the
+        # posting index, then verify the candidates with a real substring match
+        clause = Strings.value.icontains(substring, autoescape=True)
+        trigrams = self.string_service.trigrams(substring)
+        if trigrams:
+            candidates = (
+                select(StringTrigrams.string_id)
+                .where(StringTrigrams.trigram.in_(trigrams))
+                .group_by(StringTrigrams.string_id)
+                .having(func.count() == len(trigrams))
+            )
+            clause = and_(Strings.id.in_(candidates), clause)
+        return clause
+
+    def _filter_statement(
         self,
         is_palindrome: bool = None,
         min_length: int = None,
         max_length: int = None,
         word_count: int = None,
         contains_character: str = None,
+        contains: str = None,
+        min_palindrome_length: int = None,
     ):
-        logger.info(
-            f"Fetching all strings with filters: is_palindrome={is_palindrome}, min_length={min_length}, max_length={max_length}, word_count={word_count}, contains_character='{contains_character}'."
-        )
-        stmt = select(Strings)
+        # Shared by the query-parameter and the natural-language filters
+        stmt = select(Strings).where(Strings.deleted_at.is_(None))
 
         if is_palindrome is not None:
             stmt = stmt.where(Strings.is_palindrome == is_palindrome)
@@ -220,9 +537,38 @@ class StringCRUD:
             stmt = stmt.where(Strings.word_count == word_count)
         if contains_character is not None:
             stmt = stmt.where(Strings.value.ilike(f"%{contains_character}%"))
+        if contains is not None:
+            stmt = stmt.where(self._substring_clause(contains))
+        if min_palindrome_length is not None:
+            stmt = stmt.where(Strings.longest_palindrome_length >= min_palindrome_length)
+        return stmt
+
+    async def fetch_all_strings_with_filtering(
+        self,
+        is_palindrome: bool = None,
+        min_length: int = None,
+        max_length: int = None,
+        word_count: int = None,
+        contains_character: str = None,
+        contains: str = None,
+        min_palindrome_length: int = None,
+        limit: int = None,
+        offset: int = 0,
+    ):
+        logger.info(
+            f"Fetching all strings with filters: is_palindrome={is_palindrome}, min_length={min_length}, max_length={max_length}, word_count={word_count}, contains_character='{contains_character}', contains='{contains}', min_palindrome_length={min_palindrome_length}, limit={limit}, offset={offset}."
+        )
+        filters = dict(
+            is_palindrome=is_palindrome,
+            min_length=min_length,
+            max_length=max_length,
+            word_count=word_count,
+            contains_character=contains_character,
+            contains=contains,
+            min_palindrome_length=min_palindrome_length,
+        )
 
-        result = await self.db.execute(stmt)
-        strings = result.scalars().all()
+        strings = await self._filter(filters, limit=limit, offset=offset)
 
         logger.info(f"Found {len(strings)} strings matching the criteria.")
         return strings
@@ -236,49 +582,295 @@ class StringCRUD:
             )
             raise NotFoundError(f"String '{string_value}' not found.")
 
-        await self.db.delete(string)
-        await self.db.commit()
+        # Soft delete: write a tombstone, the compaction worker purges it later
+        session = self._shard(string.sha256_hash)
+        await session.execute(
+            update(Strings)
+            .where(Strings.id == string.id)
+            .values(deleted_at=func.now())
+        )
+        await bump_generation(session)
+        await session.commit()
+        on_string_deleted(string)
         logger.info(f"String '{string_value}' deleted successfully.")
         return {"message": f"String '{string_value}' deleted successfully."}
 
-    async def filter_strings_by_natural_language(self, query: str):
+    # Coalesced read paths: concurrent identical requests share one database
+    # query and one serialized JSON body (see src/singleflight.py)
+
+    @asynccontextmanager
+    async def _detached(self) -> AsyncIterator["StringCRUD"]:
+        """
+        A StringCRUD on fresh sessions bound to the same shard engines.
+
+        A coalesced load runs as a shared task that can outlive the request
+        that started it, so it must not use that request's sessions: FastAPI
+        closes them when the request ends, even if it was cancelled.
+        """
+        async with AsyncExitStack() as stack:
+            sessions = [
+                await stack.enter_async_context(
+                    AsyncSession(bind=session.bind, expire_on_commit=False)
+                )
+                for session in self.shards
+            ]
+            yield StringCRUD(db=sessions[0], shards=sessions)
+
+    async def string_response(self, string_value: str) -> bytes:
+        async def load():
+            async with self._detached() as crud:
+                string = await crud.fetch_one_string(string_value)
+            return CreateResponse(
+                id=string.sha256_hash,
+                value=string.value,
+                properties=string_properties(string),
+                created_at=string.created_at,
+            ).model_dump_json().encode()
+
+        # A stored string never changes, so its body needs no version in the key
+        key = ("string", self.string_service.sha256_hash(string_value))
+        return await read_coalescer.do(key, load)
+
+    async def filtered_strings_response(
+        self, filters: FiltersApplied, etag: str, limit: int = None, offset: int = 0
+    ) -> bytes:
+        """
+        Serialized filter results, shared with concurrent identical requests
+        that will serve them under the same `etag` (the write generations
+        read before the query). A request that saw a newer generation never
+        joins a flight loaded against an older one.
+        """
+        async def load():
+            async with self._detached() as crud:
+                strings = await crud.fetch_all_strings_with_filtering(
+                    **filters.model_dump(), limit=limit, offset=offset
+                )
+            response_data = [success_response(s) for s in strings]
+            return FilteredString(
+                data=response_data, count=len(response_data), filters_applied=filters
+            ).model_dump_json().encode()
+
+        key = ("filter", etag, filters.model_dump_json(), limit, offset)
+        return await read_coalescer.do(key, load)
+
+    async def natural_language_response(
+        self, query: str, etag: str, limit: int = None, offset: int = 0
+    ) -> bytes:
+        async def load():
+            async with self._detached() as crud:
+                response = await crud.filter_strings_by_natural_language(
+                    query=query, limit=limit, offset=offset
+                )
+            return response.model_dump_json().encode()
+
+        key = ("natural-language", etag, query, limit, offset)
+        return await read_coalescer.do(key, load)
+
+    async def explain_filtering(
+        self,
+        filters: FiltersApplied = None,
+        query: str = None,
+        limit: int = None,
+        offset: int = 0,
+    ) -> QueryExplanation:
+        """
+        Run a filter or natural-language query once, timing each phase, and
+        report the statements every shard was sent and how it planned them.
+
+        Takes the same path as `_filter`: with the columnar replica loaded,
+        that is the in-memory mask followed by by-hash IN queries for the
+        page. Never coalesced or cached: the point is to measure a fresh
+        execution. The row count and EXPLAIN run after the timed phases.
+        """
+        logger.info(f"Explaining filter query: filters={filters}, query='{query}'.")
+        started = time.perf_counter()
+
+        parsed_filters = None
+        if query is not None:
+            parsed_filters = NaturalLanguageParser().parse_query(query)
+            filters = FiltersApplied(**parsed_filters.model_dump())
+        filter_args = filters.model_dump()
+        use_replica = columnar_replica.ready and columnar_replica.supports(**filter_args)
+        stmt = None
+        if not use_replica:
+            stmt = self._filter_statement(**filter_args)
+        parsed = time.perf_counter()
+
+        hashes = None
+        if use_replica:
+            hashes = columnar_replica.query(**filter_args, limit=limit, offset=offset)
+            statements = self._hash_statements(hashes)
+        else:
+            shard_stmt = self._shard_statement(stmt, limit=limit, offset=offset)
+            statements = {shard: [shard_stmt] for shard in range(len(self.shards))}
+        masked = time.perf_counter()
+
+        def run(session, shard_statements):
+            # The sync session does not pre-buffer ORM rows, so the round trip
+            # and the hydration of Strings objects can be timed separately
+            rows, query_time, hydration_time = [], 0.0, 0.0
+            for shard_stmt in shard_statements:
+                start = time.perf_counter()
+                result = session.execute(shard_stmt)
+                fetched = time.perf_counter()
+                rows.extend(result.scalars().all())
+                query_time += fetched - start
+                hydration_time += time.perf_counter() - fetched
+            return rows, query_time, hydration_time
+
+        shards = list(statements)
+        runs = await asyncio.gather(
+            *(self.shards[shard].run_sync(run, statements[shard]) for shard in shards)
+        )
+        queried = time.perf_counter()
+        if use_replica:
+            found = {string.sha256_hash: string for rows, _, _ in runs for string in rows}
+            strings = [found[sha256_hash] for sha256_hash in hashes if sha256_hash in found]
+        else:
+            strings = self._merge([rows for rows, _, _ in runs], limit=limit, offset=offset)
+        merged = time.perf_counter()
+
+        response_data = [success_response(s) for s in strings]
+        if query is not None:
+            NLPFiltering(
+                data=response_data,
+                count=len(response_data),
+                interpreted_query=InterpretedQuery(original=query, parsed_filters=parsed_filters),
+            ).model_dump_json()
+        else:
+            FilteredString(
+                data=response_data, count=len(response_data), filters_applied=filters
+            ).model_dump_json()
+        finished = time.perf_counter()
+
+        if use_replica:
+            matched = columnar_replica.count(**filter_args)
+        else:
+            count_stmt = select(func.count()).select_from(stmt.subquery())
+            matched = sum(
+                await asyncio.gather(*(session.scalar(count_stmt) for session in self.shards))
+            )
+        # Chunks of one shard share a shape, so the first one's plan stands for all
+        plans = await asyncio.gather(
+            *(explain_plan(self.shards[shard], statements[shard][0]) for shard in shards)
+        )
+
+        hydration = sum(hydration for _, _, hydration in runs) + merged - queried
+        dialect = (await self.db.connection()).dialect
+        return QueryExplanation(
+            query=query,
+            filters_applied=filters,
+            limit=limit,
+            offset=offset,
+            source="columnar_replica" if use_replica else "database",
+            hashes=len(hashes) if use_replica else None,
+            sql=";\n".join(
+                render_sql(shard_stmt, dialect)
+                for shard in shards
+                for shard_stmt in statements[shard]
+            ),
+            row_counts=RowCounts(
+                matched=matched,
+                fetched=sum(len(rows) for rows, _, _ in runs),
+                returned=len(strings),
+            ),
+            timings_ms=TimingBreakdown(
+                parse=(parsed - started) * 1000,
+                mask=(masked - parsed) * 1000 if use_replica else None,
+                query=max((query_time for _, query_time, _ in runs), default=0.0) * 1000,
+                hydration=hydration * 1000,
+                serialization=(finished - merged) * 1000,
+                total=(finished - started) * 1000,
+            ),
+            shards=[
+                ShardExplanation(
+                    shard=shard,
+                    rows=len(rows),
+                    queries=len(statements[shard]),
+                    query_ms=query_time * 1000,
+                    hydration_ms=hydration_time * 1000,
+                    **plan,
+                )
+                for shard, (rows, query_time, hydration_time), plan in zip(shards, runs, plans)
+            ],
+        )
+
+    async def lookup_strings(
+        self, values: list[str] = None, ids: list[str] = None
+    ) -> LookupResponse:
+        """
+        Resolve many strings, given by value or by sha256 id, with a few
+        chunked IN queries instead of one query per string.
+
+        Found strings and misses both keep the input order; a repeated input
+        is answered once, at its first position.
+        """
+        inputs = list(dict.fromkeys(values if values is not None else ids))
+        if values is not None:
+            hashes = [self.string_service.sha256_hash(value) for value in inputs]
+        else:
+            # Anything that is not a sha256 hex digest cannot match (or be routed)
+            hashes = [
+                sha256_hash.lower() if SHA256_HEX.fullmatch(sha256_hash) else None
+                for sha256_hash in inputs
+            ]
+        logger.info(f"Looking up {len(inputs)} strings by {'value' if values is not None else 'id'}.")
+
+        found = await self._fetch_by_hashes(
+            list({sha256_hash for sha256_hash in hashes if sha256_hash is not None})
+        )
+
+        response_data, misses = [], []
+        for item, sha256_hash in zip(inputs, hashes):
+            string = found.get(sha256_hash)
+            if string is None:
+                misses.append(item)
+            else:
+                response_data.append(success_response(string))
+
+        logger.info(f"Lookup found {len(response_data)} strings, {len(misses)} misses.")
+        return LookupResponse(data=response_data, count=len(response_data), misses=misses)
+
+    async def fetch_anagrams(self, string_value: str):
+        signature = self.string_service.anagram_signature(string_value)
+        logger.info(f"Fetching anagrams of '{string_value}' (signature '{signature}').")
+        # A single probe of the anagram signature index (on each shard)
+        stmt = select(Strings).where(
+            Strings.anagram_signature == signature,
+            Strings.deleted_at.is_(None),
+            Strings.value != string_value,
+        )
+
+        strings = await self._scatter(stmt)
+
+        logger.info(f"Found {len(strings)} anagrams of '{string_value}'.")
+        return signature, strings
+
+    async def find_similar_strings(self, string_value: str, k: int = 10):
+        # Answered entirely from the in-memory index, no database round trip
+        logger.info(f"Finding {k} strings similar to '{string_value}'.")
+        freq_map = self.string_service.character_frequency_map(string_value)
+        query_hash = self.string_service.sha256_hash(string_value)
+
+        # Ask for one extra match so the query string itself can be dropped
+        matches = [
+            SimilarString(id=sha256_hash, value=value, score=score)
+            for sha256_hash, value, score in similarity_index.top_k(freq_map, k + 1)
+            if sha256_hash != query_hash
+        ][:k]
+        return SimilarStrings(data=matches, count=len(matches), query=string_value)
+
+    async def filter_strings_by_natural_language(
+        self, query: str, limit: int = None, offset: int = 0
+    ):
         logger.info(f"Filtering strings by natural language query: '{query}'.")
         parser = NaturalLanguageParser()
         parsed_filters = parser.parse_query(query)
 
-        stmt = select(Strings)
-
-        if parsed_filters.is_palindrome is not None:
-            stmt = stmt.where(Strings.is_palindrome == parsed_filters.is_palindrome)
-        if parsed_filters.min_length is not None:
-            stmt = stmt.where(Strings.length >= parsed_filters.min_length)
-        if parsed_filters.max_length is not None:
-            stmt = stmt.where(Strings.length <= parsed_filters.max_length)
-        if parsed_filters.word_count is not None:
-            stmt = stmt.where(Strings.word_count == parsed_filters.word_count)
-        if parsed_filters.contains_character is not None:
-            stmt = stmt.where(Strings.value.ilike(f"%{parsed_filters.contains_character}%"))
-
-        result = await self.db.execute(stmt)
-        strings = result.scalars().all()
+        strings = await self._filter(parsed_filters.model_dump(), limit=limit, offset=offset)
 
         # Convert ORM objects to Pydantic models for response
-        response_data = [
-            SuccessResponse(
-                id=str(s.sha256_hash),
-                value=s.value,
-                properties={
-                    "length": s.length,
-                    "is_palindrome": s.is_palindrome,
-                    "unique_characters": s.unique_characters,
-                    "word_count": s.word_count,
-                    "sha256_hash": s.sha256_hash,
-                    "character_frequency_map": s.character_frequency_map,
-                },
-                created_at=s.created_at,
-            )
-            for s in strings
-        ]
+        response_data = [success_response(s) for s in strings]
 
         interpreted_query = InterpretedQuery(original=query, parsed_filters=parsed_filters)
         
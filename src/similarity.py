@@ -0,0 +1,134 @@
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db import Strings, config
+from src.log import setup_logger
+
+# Set up logger
+logger = setup_logger(__name__, "similarity.log")
+
+# Code points below this get a column of their own
+ASCII = 128
+
+
+class SimilarityIndex:
+    """
+    In-memory matrix of L2-normalized character-frequency vectors.
+
+    Each stored string is one row with a fixed number of columns, so memory
+    per row is bounded however many distinct characters clients send. The
+    first 128 columns hold ASCII characters exactly; every other code point
+    is folded into the remaining `dimensions - 128` buckets, where it can
+    only collide with other non-ASCII characters (so "café" never scores
+    like "cafi"). Cosine similarity against a query is then a single
+    matrix-vector product over all rows, followed by a top-k partial sort.
+
+    Rows are over-allocated and doubled on demand, and deletes swap the last
+    row into the freed slot, so create and delete are amortized O(dimensions)
+    instead of rebuilding the matrix.
+    """
+
+    def __init__(self, capacity: int = 1024, dimensions: int = config.SIMILARITY_DIMENSIONS):
+        if dimensions <= ASCII:
+            raise ValueError(f"Similarity index needs more than {ASCII} dimensions, got {dimensions}.")
+        self._matrix = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._ids: list[str] = []  # sha256_hash per row
+        self._values: list[str] = []
+        self._rows: dict[str, int] = {}  # sha256_hash -> row
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, sha256_hash: str) -> bool:
+        return sha256_hash in self._rows
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes
+
+    def clear(self):
+        self.__init__(dimensions=self._matrix.shape[1])
+
+    def _grow(self, rows: int):
+        capacity, dimensions = self._matrix.shape
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        matrix = np.zeros((capacity, dimensions), dtype=np.float32)
+        matrix[: len(self._ids)] = self._matrix[: len(self._ids)]
+        self._matrix = matrix
+
+    def _vector(self, freq_map: dict[str, int]) -> np.ndarray:
+        dimensions = self._matrix.shape[1]
+        vector = np.zeros(dimensions, dtype=np.float32)
+        for char, count in freq_map.items():
+            code_point = ord(char)
+            if code_point >= ASCII:
+                code_point = ASCII + (code_point - ASCII) % (dimensions - ASCII)
+            vector[code_point] += count
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def add(self, sha256_hash: str, value: str, freq_map: dict[str, int]):
+        if sha256_hash in self._rows:
+            return
+        self._grow(len(self._ids) + 1)
+
+        row = len(self._ids)
+        self._matrix[row] = self._vector(freq_map)
+        self._ids.append(sha256_hash)
+        self._values.append(value)
+        self._rows[sha256_hash] = row
+
+    def remove(self, sha256_hash: str):
+        row = self._rows.pop(sha256_hash, None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        if row != last:
+            # Move the last row into the hole to keep the matrix dense
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = self._ids[last]
+            self._values[row] = self._values[last]
+            self._rows[self._ids[row]] = row
+        self._matrix[last] = 0
+        self._ids.pop()
+        self._values.pop()
+
+    def top_k(self, freq_map: dict[str, int], k: int) -> list[tuple[str, str, float]]:
+        """
+        Return up to k (sha256_hash, value, score) tuples, most similar first.
+        """
+        size = len(self._ids)
+        if size == 0 or k <= 0:
+            return []
+        scores = self._matrix[:size] @ self._vector(freq_map)
+        if k < size:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(size)
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self._ids[i], self._values[i], float(scores[i])) for i in best]
+
+
+# Shared index, loaded at startup and kept in sync by StringCRUD
+similarity_index = SimilarityIndex()
+
+
+async def load_similarity_index(sessions: list[AsyncSession], batch_size: int = 10_000):
+    """
+    Rebuild the shared similarity index from every live string on every shard.
+    """
+    similarity_index.clear()
+    stmt = (
+        select(Strings.sha256_hash, Strings.value, Strings.character_frequency_map)
+        .where(Strings.deleted_at.is_(None))
+        .execution_options(yield_per=batch_size)
+    )
+    for session in sessions:
+        result = await session.stream(stmt)
+        async for sha256_hash, value, freq_map in result:
+            similarity_index.add(sha256_hash, value, freq_map)
+    logger.info(f"Similarity index loaded with {len(similarity_index)} strings.")
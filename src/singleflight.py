@@ -0,0 +1,47 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical calls into one.
+
+    The first caller for a key (the leader) runs the call as its own task;
+    callers arriving with the same key while it is in flight await that task
+    instead of repeating the work, and receive the same result or exception.
+    A read whose result depends on writes must put a version in its key, so
+    that a call started before a write is never shared with a caller that
+    arrived after it.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        flight = self._calls.get(key)
+        if flight is not None:
+            self.collapsed += 1
+        else:
+            self.leaders += 1
+            flight = asyncio.ensure_future(call())
+            self._calls[key] = flight
+            flight.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Shielded so one cancelled caller does not cancel the shared call
+        return await asyncio.shield(flight)
+
+    def metrics(self) -> dict:
+        total = self.leaders + self.collapsed
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.leaders,
+            "collapsed": self.collapsed,
+            "collapse_ratio": self.collapsed / total if total else 0.0,
+        }
+
+
+# Shared by every StringCRUD read path
+read_coalescer = SingleFlight()
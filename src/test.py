@@ -1,10 +1,32 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.pool import StaticPool
-from src.db import Base, get_session
+import sqlalchemy as sa
+from sqlalchemy import delete, func, select, update
+from starlette.requests import Request
+from src.admission import AdmissionController, expensive_admission
+from src.cache import bump_generation, read_generation
+from src.columnar import ColumnarReplica, columnar_replica, load_columnar_replica
+from src.db import config, Base, Strings, StringTrigrams, get_session, get_shard_sessions, seed_generation, shard_index
+from src.error import ServiceOverloaded
+from src.events import EventBroker, event_broker
+from src.explain import render_sql
+from src import loader, main
 from src.main import app
+from src.migrate import migrate
+from src.schema import FiltersApplied
+from src.service import StringCRUD, StringService, shutdown_analysis_pool
+from src.similarity import SimilarityIndex, similarity_index
+from src.singleflight import SingleFlight, read_coalescer
+from src.worker import expire_strings, purge_tombstones
 
 # Setup test database
 DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -30,6 +52,8 @@ app.dependency_overrides[get_session] = override_get_session
 @pytest_asyncio.fixture(scope="function")
 async def setup_database():
     """Setup and teardown database for each test"""
+    similarity_index.clear()
+    columnar_replica.clear()
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     yield
@@ -229,3 +253,777 @@ async def test_delete_string_not_found(client: AsyncClient):
     assert response.status_code == 404
     response_data = response.json()
     assert "not found" in (response_data.get("detail") or response_data.get("value") or str(response_data))
+
+@pytest.mark.asyncio
+async def test_delete_is_soft_and_purged_by_worker(client: AsyncClient):
+    await client.post("/strings", json={"value": "tombstone"})
+    response = await client.delete("/strings/tombstone")
+    assert response.status_code == 200
+
+    # The row is still there as a tombstone, hidden from every read path
+    async with TestingSessionLocal() as session:
+        rows = (await session.execute(select(Strings))).scalars().all()
+        assert len(rows) == 1 and rows[0].deleted_at is not None
+    assert (await client.get("/strings/tombstone")).status_code == 404
+    assert (await client.get("/strings")).json()["count"] == 0
+
+    # The value can be stored again while the tombstone is pending
+    assert (await client.post("/strings", json={"value": "tombstone"})).status_code == 201
+
+    async with TestingSessionLocal() as session:
+        assert await purge_tombstones(session, batch_size=1) == 1
+        rows = (await session.execute(select(Strings))).scalars().all()
+        assert len(rows) == 1 and rows[0].deleted_at is None
+
+@pytest.mark.asyncio
+async def test_migrate_upgrades_and_backfills_old_databases():
+    # `strings` as created before the derived columns and postings existed
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(
+            "CREATE TABLE strings (id CHAR(32) PRIMARY KEY, created_at DATETIME, "
+            "updated_at DATETIME, deleted_at DATETIME, value VARCHAR NOT NULL, "
+            "length INTEGER NOT NULL, is_palindrome BOOLEAN NOT NULL, "
+            "unique_characters INTEGER NOT NULL, word_count INTEGER NOT NULL, "
+            "sha256_hash VARCHAR NOT NULL, character_frequency_map JSON NOT NULL)"
+        )
+        for value in ["Dormitory racecar", "ab"]:
+            row = StringService().analyze(value)
+            await conn.execute(
+                sa.text(
+                    "INSERT INTO strings VALUES (:id, '2024-01-01 00:00:00', '2024-01-01 00:00:00', "
+                    "NULL, :value, :length, :is_palindrome, :unique_characters, :word_count, "
+                    ":sha256_hash, :character_frequency_map)"
+                ),
+                {**row, "id": uuid.uuid4().hex, "character_frequency_map": json.dumps(row["character_frequency_map"])},
+            )
+    try:
+        assert await migrate(engine, batch_size=1) == 2
+        async with TestingSessionLocal() as session:
+            string = (await session.execute(select(Strings).where(Strings.value == "Dormitory racecar"))).scalar_one()
+            assert string.anagram_signature == StringService().anagram_signature("Dormitory racecar")
+            assert (string.longest_palindrome, string.longest_palindrome_offset) == ("racecar", 10)
+            postings = await session.scalar(select(func.count()).select_from(StringTrigrams))
+            assert postings == len(StringService().trigrams("Dormitory racecar"))
+            indexes = await session.execute(sa.text("SELECT name FROM sqlite_master WHERE type = 'index'"))
+            assert {"ix_strings_anagram_signature_live", "ix_string_trigrams_string_id"} <= set(indexes.scalars())
+            assert await read_generation(session) != "0"
+
+        # Nothing left to do on a rerun ("ab" is too short for postings);
+        # --recompute re-analyzes every row
+        assert await migrate(engine) == 0
+        assert await migrate(engine, recompute=True) == 2
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+
+@pytest.mark.asyncio
+async def test_purge_deletes_postings_by_index(setup_database):
+    # The purge's posting delete must probe the string_id index, not scan
+    stmt = delete(StringTrigrams).where(StringTrigrams.string_id.in_([uuid.uuid4(), uuid.uuid4()]))
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + render_sql(stmt, conn.dialect))
+        plan = [row[-1] for row in result.all()]
+    assert any("ix_string_trigrams_string_id" in line for line in plan), plan
+    assert not any(line.startswith("SCAN string_trigrams") for line in plan), plan
+
+@pytest.mark.asyncio
+async def test_retention_ttl_expires_old_strings(client: AsyncClient):
+    await client.post("/strings", json={"value": "short lived"})
+    async with TestingSessionLocal() as session:
+        assert await expire_strings(session, ttl_seconds=3600, batch_size=10) == 0
+        assert await expire_strings(session, ttl_seconds=-3600, batch_size=10) == 1
+    assert (await client.get("/strings/short lived")).status_code == 404
+
+@pytest.mark.asyncio
+async def test_similar_strings(client: AsyncClient):
+    for value in ["listen", "silent", "enlist", "banana", "zzz"]:
+        await client.post("/strings", json={"value": value})
+    await client.delete("/strings/enlist")
+
+    response = await client.get("/strings/listen/similar?k=2")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["count"] == 2
+    # "listen" itself is excluded, "enlist" was deleted
+    assert data["data"][0]["value"] == "silent"
+    assert data["data"][0]["score"] == pytest.approx(1.0)
+    assert data["data"][1]["score"] < 1.0
+
+    assert (await client.get("/strings/listen/similar?k=0")).status_code == 400
+
+def test_similarity_index_grows_and_removes():
+    index = SimilarityIndex(capacity=1)
+    index.add("a", "ab", {"a": 1, "b": 1})
+    index.add("b", "cd", {"c": 1, "d": 1})
+    index.add("c", "abab", {"a": 2, "b": 2})
+    index.remove("a")
+    assert len(index) == 2 and "a" not in index
+    assert [match[0] for match in index.top_k({"a": 1, "b": 1}, 5)] == ["c", "b"]
+
+
+def test_similarity_index_keeps_ascii_apart_from_other_scripts():
+    index = SimilarityIndex()
+    index.add("accented", "café", {"c": 1, "a": 1, "f": 1, "é": 1})
+    index.add("ascii", "cafi", {"c": 1, "a": 1, "f": 1, "i": 1})
+    matches = index.top_k({"c": 1, "a": 1, "f": 1, "i": 1}, 2)
+    assert [match[0] for match in matches] == ["ascii", "accented"]
+    assert matches[0][2] == pytest.approx(1.0) and matches[1][2] == pytest.approx(0.75)
+    assert index.top_k({"c": 1, "a": 1, "f": 1, "é": 1}, 1)[0][0] == "accented"
+
+
+def test_similarity_index_memory_is_bounded():
+    index = SimilarityIndex(dimensions=256)
+    for i in range(1000):
+        index.add(f"h{i}", f"value {i}", {"v": 1, str(i % 10): 1})
+    # Thousands of distinct characters in one string must not widen the matrix
+    wide = {chr(0x4E00 + i): 1 for i in range(3000)}
+    index.add("cjk", "".join(wide), wide)
+    assert len(index) == 1001
+    assert index.nbytes == 1024 * 256 * 4
+    assert index.top_k(wide, 1)[0][0] == "cjk"
+
+@pytest.mark.asyncio
+async def test_anagrams(client: AsyncClient):
+    for value in ["Dormitory", "dirty room", "dirtyroom!", "listen"]:
+        await client.post("/strings", json={"value": value})
+
+    response = await client.get("/strings/dormitory/anagrams")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["signature"] == "dimoorrty"
+    assert sorted(item["value"] for item in data["data"]) == ["Dormitory", "dirty room"]
+
+    # The queried value itself is not reported as its own anagram
+    response = await client.get("/strings/listen/anagrams")
+    assert response.json()["count"] == 0
+
+@pytest.mark.asyncio
+async def test_substring_filter(client: AsyncClient):
+    for value in ["Pineapple", "apple pie", "grape", "app", "100%_done"]:
+        await client.post("/strings", json={"value": value})
+
+    response = await client.get("/strings?contains=APPLE")
+    data = response.json()
+    assert sorted(item["value"] for item in data["data"]) == ["Pineapple", "apple pie"]
+    assert data["filters_applied"]["contains"] == "APPLE"
+
+    # Short substrings have no trigrams and fall back to a plain scan
+    response = await client.get("/strings?contains=pp")
+    assert response.json()["count"] == 3
+
+    # LIKE wildcards in the substring are matched literally
+    response = await client.get("/strings", params={"contains": "0%_"})
+    assert [item["value"] for item in response.json()["data"]] == ["100%_done"]
+    response = await client.get("/strings", params={"contains": "a_p"})
+    assert response.json()["count"] == 0
+
+    response = await client.get("/strings/filter-by-natural-language?query=strings containing 'pie'")
+    data = response.json()
+    assert data["interpreted_query"]["parsed_filters"]["contains"] == "pie"
+    assert [item["value"] for item in data["data"]] == ["apple pie"]
+
+def test_longest_palindrome():
+    service = StringService()
+    assert service.longest_palindrome("") == ("", 0, 0)
+    assert service.longest_palindrome("abc") == ("a", 1, 0)
+    assert service.longest_palindrome("xxabbaY") == ("abba", 4, 2)
+    assert service.longest_palindrome("my Racecar!") == ("Racecar", 7, 3)
+
+@pytest.mark.asyncio
+async def test_longest_palindrome_property_and_filter(client: AsyncClient):
+    response = await client.post("/strings", json={"value": "banana split"})
+    properties = response.json()["properties"]
+    assert properties["longest_palindrome"] == "anana"
+    assert properties["longest_palindrome_length"] == 5
+    assert properties["longest_palindrome_offset"] == 1
+    await client.post("/strings", json={"value": "abcd"})
+
+    response = await client.get("/strings?min_palindrome_length=3")
+    data = response.json()
+    assert [item["value"] for item in data["data"]] == ["banana split"]
+    assert data["filters_applied"]["min_palindrome_length"] == 3
+
+@pytest.mark.asyncio
+async def test_large_values_are_analyzed_off_the_event_loop(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(config, "ANALYSIS_INLINE_MAX_LENGTH", 1000)
+    value = "ab" * 150_000  # most of a second of pure-Python analysis
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        response = await client.post("/strings", json={"value": value})
+    finally:
+        task.cancel()
+        shutdown_analysis_pool()
+    assert response.status_code == 201
+    assert response.json()["properties"]["longest_palindrome_length"] == len(value) - 1
+    # Other work kept running while the value was analyzed
+    assert ticks >= 20
+
+@pytest.mark.asyncio
+async def test_conditional_get_single_string(client: AsyncClient):
+    await client.post("/strings", json={"value": "cached"})
+    response = await client.get("/strings/cached")
+    etag = response.headers["etag"]
+    assert etag == f'"{response.json()["id"]}"'
+    assert "immutable" in response.headers["cache-control"]
+
+    response = await client.get("/strings/cached", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # A deleted string is never reported as unchanged
+    await client.delete("/strings/cached")
+    response = await client.get("/strings/cached", headers={"If-None-Match": etag})
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_conditional_get_filter_results(client: AsyncClient):
+    await client.post("/strings", json={"value": "first"})
+    response = await client.get("/strings?min_length=1")
+    etag = response.headers["etag"]
+    assert etag.startswith("W/")
+
+    response = await client.get("/strings?min_length=1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response = await client.get(
+        "/strings/filter-by-natural-language?query=palindromes",
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 304
+
+    # Any write invalidates filter results
+    await client.post("/strings", json={"value": "second"})
+    response = await client.get("/strings?min_length=1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["count"] == 2
+
+@pytest.mark.asyncio
+async def test_conditional_gets_see_writes_from_other_processes(client: AsyncClient):
+    await client.post("/strings", json={"value": "served"})
+    response = await client.get("/strings?min_length=1")
+    filter_etag = response.headers["etag"]
+    string_etag = (await client.get("/strings/served")).headers["etag"]
+
+    # Rows written by the bulk loader never pass through this process's hooks
+    async with TestingSessionLocal() as session:
+        assert await loader.store_batch([session], loader.analyze_batch(["loaded"])) == 1
+    response = await client.get("/strings?min_length=1", headers={"If-None-Match": filter_etag})
+    assert response.status_code == 200 and response.json()["count"] == 2
+
+    # Nor does a delete made by another worker process
+    async with TestingSessionLocal() as session:
+        await session.execute(
+            update(Strings).where(Strings.value == "served").values(deleted_at=func.now())
+        )
+        await bump_generation(session)
+        await session.commit()
+    response = await client.get("/strings/served", headers={"If-None-Match": string_etag})
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_change_feed_publishes_filtered_events(client: AsyncClient):
+    subscription = event_broker.subscribe(FiltersApplied(is_palindrome=True))
+    try:
+        await client.post("/strings", json={"value": "kayak"})
+        await client.post("/strings", json={"value": "canoe"})
+        await client.delete("/strings/kayak")
+
+        created = subscription.queue.get_nowait()
+        deleted = subscription.queue.get_nowait()
+        assert subscription.queue.empty()
+        assert (created.type, created.data["value"]) == ("created", "kayak")
+        assert (deleted.type, deleted.data["value"]) == ("deleted", "kayak")
+        assert created.encode().startswith(f"id: {created.id}\nevent: created\n")
+
+        # Resuming from the first event replays only what came after it
+        resumed = event_broker.subscribe(FiltersApplied(), last_event_id=created.id)
+        assert [resumed.queue.get_nowait().type for _ in range(2)] == ["created", "deleted"]
+        event_broker.unsubscribe(resumed)
+    finally:
+        event_broker.unsubscribe(subscription)
+
+@pytest.mark.asyncio
+async def test_change_feed_disconnects_slow_consumers():
+    broker = EventBroker(buffer_size=2, history_size=2)
+    data = {"value": "x", "properties": {}}
+    slow = broker.subscribe(FiltersApplied())
+    for _ in range(3):
+        broker.publish("created", data)
+    assert slow.overflowed and len(broker) == 0
+
+    chunks = [chunk async for chunk in broker.stream(slow)]
+    assert chunks == ['event: overflow\ndata: {"dropped": 2}\n\n']
+
+    # History only holds the last two events, so resuming from the start has a
+    # gap: the client resyncs and its next reconnect resumes after event 3
+    late = broker.subscribe(FiltersApplied(), last_event_id=f"{broker.boot_id}-0")
+    assert late.missed_events and late.queue.qsize() == 0
+    assert late.resync_id == f"{broker.boot_id}-3"
+    assert broker.subscribe(FiltersApplied(), last_event_id="stale-1").missed_events
+
+@pytest.mark.asyncio
+async def test_change_feed_resyncs_instead_of_overflowing_on_replay():
+    broker = EventBroker(buffer_size=2, history_size=300)
+    data = {"value": "x", "properties": {}}
+    for _ in range(300):
+        broker.publish("created", data)
+
+    # 300 buffered events would not fit the queue: resync instead of an
+    # overflow that the client would hit again on every reconnect
+    resumed = broker.subscribe(FiltersApplied(), last_event_id=f"{broker.boot_id}-0")
+    assert resumed.missed_events and not resumed.overflowed
+    stream = broker.stream(resumed)
+    assert await anext(stream) == f"id: {broker.boot_id}-300\nevent: resync\ndata: {{}}\n\n"
+    await stream.aclose()
+
+    # A replay that fits is delivered as usual
+    again = broker.subscribe(FiltersApplied(), last_event_id=f"{broker.boot_id}-298")
+    assert not again.missed_events and again.queue.qsize() == 2
+
+def event_request(headers: dict = {}) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/strings/events",
+        "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+async def first_chunks(response, count: int) -> list[str]:
+    # The stream never ends on its own: read a few chunks, then hang up
+    chunks = []
+    async for chunk in response.body_iterator:
+        chunks.append(chunk)
+        if len(chunks) == count:
+            break
+    await response.body_iterator.aclose()
+    return chunks
+
+@pytest.mark.asyncio
+async def test_change_feed_route_streams_sse(monkeypatch):
+    broker = EventBroker(buffer_size=8, history_size=8)
+    monkeypatch.setattr(main, "event_broker", broker)
+    level = {"value": "level", "properties": {"is_palindrome": True}}
+    canoe = {"value": "canoe", "properties": {"is_palindrome": False}}
+    broker.publish("created", level)
+    broker.publish("created", canoe)
+
+    response = await main.stream_string_events(
+        event_request(), is_palindrome=False, last_event_id=f"{broker.boot_id}-0"
+    )
+    assert response.media_type == "text/event-stream"
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.headers["x-accel-buffering"] == "no"
+    assert await first_chunks(response, 1) == [
+        f"id: {broker.boot_id}-2\nevent: created\ndata: {json.dumps(canoe)}\n\n"
+    ]
+    assert len(broker) == 0
+
+    response = await main.stream_string_events(event_request(), last_event_id="stale-1")
+    assert await first_chunks(response, 1) == [f"id: {broker.boot_id}-2\nevent: resync\ndata: {{}}\n\n"]
+
+@pytest.mark.asyncio
+async def test_change_feed_route_prefers_last_event_id_header(monkeypatch):
+    broker = EventBroker(buffer_size=8, history_size=8)
+    monkeypatch.setattr(main, "event_broker", broker)
+    for value in ("level", "canoe"):
+        broker.publish("created", {"value": value, "properties": {}})
+
+    # EventSource's reconnect header wins over a stale query parameter
+    response = await main.stream_string_events(
+        event_request({"Last-Event-ID": f"{broker.boot_id}-1"}), last_event_id="stale-1"
+    )
+    chunks = await first_chunks(response, 1)
+    assert chunks[0].startswith(f"id: {broker.boot_id}-2\nevent: created\n")
+
+@pytest.mark.asyncio
+async def test_admission_controller_queues_and_rejects():
+    controller = AdmissionController("test", limit=1, queue_size=1, timeout=0.05)
+    await controller.acquire()
+
+    # One request may wait; it gets the slot as soon as it is released
+    waiter = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(ServiceOverloaded):
+        await controller.acquire()  # queue full, rejected without waiting
+    controller.release()
+    await waiter
+    assert controller.active == 1
+
+    with pytest.raises(ServiceOverloaded) as exc_info:
+        await controller.acquire()  # waits out the timeout
+    assert exc_info.value.retry_after >= 1
+    controller.release()
+    assert controller.active == 0 and controller.rejected == 2
+
+@pytest.mark.asyncio
+async def test_expensive_routes_shed_load_separately(client: AsyncClient, monkeypatch):
+    await client.post("/strings", json={"value": "cheap"})
+    monkeypatch.setattr(expensive_admission, "queue_size", 0)
+    for _ in range(expensive_admission.limit):
+        await expensive_admission.acquire()
+    try:
+        response = await client.get("/strings")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+        # Single-string lookups have their own budget and still get through
+        assert (await client.get("/strings/cheap")).status_code == 200
+    finally:
+        for _ in range(expensive_admission.limit):
+            expensive_admission.release()
+    assert (await client.get("/strings")).status_code == 200
+
+@pytest.mark.asyncio
+async def test_single_flight_collapses_concurrent_calls():
+    coalescer = SingleFlight()
+    calls = 0
+
+    async def slow_query():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"result"
+
+    results = await asyncio.gather(*(coalescer.do("key", slow_query) for _ in range(5)))
+    assert results == [b"result"] * 5
+    assert calls == 1
+    assert coalescer.metrics()["collapsed"] == 4
+
+    # Completed flights are not reused
+    await coalescer.do("key", slow_query)
+    assert calls == 2 and coalescer.metrics()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_reads_share_a_query(client: AsyncClient):
+    await client.post("/strings", json={"value": "popular"})
+    before = read_coalescer.metrics()
+
+    responses = await asyncio.gather(*(client.get("/strings/popular") for _ in range(10)))
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.content for response in responses}) == 1
+
+    after = (await client.get("/metrics/coalescing")).json()
+    served = (after["executed"] + after["collapsed"]) - (before["executed"] + before["collapsed"])
+    assert served == 10
+    assert after["collapsed"] > before["collapsed"]
+
+@pytest.mark.asyncio
+async def test_coalesced_read_survives_leader_cancellation(client: AsyncClient, monkeypatch):
+    await client.post("/strings", json={"value": "shared"})
+    started, release, used = asyncio.Event(), asyncio.Event(), []
+    original = StringCRUD.fetch_all_strings_with_filtering
+
+    async def slow(self, **kwargs):
+        used.append(self.db)
+        started.set()
+        await release.wait()
+        return await original(self, **kwargs)
+
+    monkeypatch.setattr(StringCRUD, "fetch_all_strings_with_filtering", slow)
+    filters = FiltersApplied(min_length=1)
+    leader_session, follower_session = TestingSessionLocal(), TestingSessionLocal()
+    leader = asyncio.create_task(StringCRUD(leader_session).filtered_strings_response(filters, etag="v1"))
+    await started.wait()
+    follower = asyncio.create_task(StringCRUD(follower_session).filtered_strings_response(filters, etag="v1"))
+    await asyncio.sleep(0)
+
+    # The leader's request goes away and its session is closed mid-load
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    await leader_session.close()
+    release.set()
+
+    assert json.loads(await follower)["count"] == 1
+    assert used[0] is not leader_session
+    await follower_session.close()
+
+@pytest.mark.asyncio
+async def test_coalesced_filter_reads_are_keyed_by_generation(client: AsyncClient, monkeypatch):
+    await client.post("/strings", json={"value": "before"})
+    started, release, calls = asyncio.Event(), asyncio.Event(), []
+    original = StringCRUD.fetch_all_strings_with_filtering
+
+    async def slow(self, **kwargs):
+        calls.append(kwargs)
+        started.set()
+        await release.wait()
+        return await original(self, **kwargs)
+
+    monkeypatch.setattr(StringCRUD, "fetch_all_strings_with_filtering", slow)
+    filters = FiltersApplied(min_length=1)
+    async with TestingSessionLocal() as old_session, TestingSessionLocal() as new_session:
+        old = asyncio.create_task(StringCRUD(old_session).filtered_strings_response(filters, etag="old"))
+        await started.wait()
+        # A request that saw a newer generation runs its own query instead of
+        # taking a body that would be served under the wrong ETag
+        new = asyncio.create_task(StringCRUD(new_session).filtered_strings_response(filters, etag="new"))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(old, new)
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_bump_generation_seeds_a_missing_row(setup_database):
+    async with TestingSessionLocal() as session:
+        # create_all alone does not seed the row; init_db does, idempotently
+        await bump_generation(session)
+        await bump_generation(session)
+        await session.execute(seed_generation(session.bind.dialect.name))
+        await session.commit()
+        assert (await read_generation(session)).endswith(".2")
+
+@pytest.mark.asyncio
+async def test_explain_filter_queries(client: AsyncClient):
+    for value in ["Pineapple", "apple pie", "grape", "kayak"]:
+        await client.post("/strings", json={"value": value})
+
+    response = await client.get("/strings?contains=apple&min_length=5&limit=1&explain=true")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["filters_applied"]["contains"] == "apple"
+    assert "string_trigrams" in data["sql"] and "LIMIT 1" in data["sql"]
+    assert data["row_counts"] == {"matched": 2, "fetched": 1, "returned": 1}
+    assert set(data["timings_ms"]) == {"parse", "mask", "query", "hydration", "serialization", "total"}
+    assert data["source"] == "database" and data["timings_ms"]["mask"] is None
+    [shard] = data["shards"]
+    assert shard["dialect"] == "sqlite" and shard["analyze"] is False
+    # The trigram posting index is what narrows the candidates
+    assert any("string_trigrams" in line for line in shard["plan"])
+
+    response = await client.get("/strings/filter-by-natural-language?query=single word palindrome strings&explain=true")
+    data = response.json()
+    assert data["query"] == "single word palindrome strings"
+    assert data["filters_applied"]["is_palindrome"] is True
+    assert data["row_counts"]["returned"] == 1
+
+    # Explaining never touches the coalescer or the ETag path
+    assert "ETag" not in response.headers
+
+
+def test_columnar_replica_masks_and_orders():
+    replica = ColumnarReplica(capacity=1, words=1)
+    rows = [
+        ("h3", "Kayak", 5, 1, True, 5, 3),
+        ("h1", "level up", 8, 2, False, 5, 1),
+        ("h2", "abc", 3, 1, False, 1, 1),
+    ]
+    # Enough distinct characters to need a second bitset word
+    rows.append(("h4", "".join(chr(0x3b1 + i) for i in range(70)), 70, 1, False, 1, 2))
+    for sha256_hash, value, length, words, palindrome, longest, second in rows:
+        replica.add(SimpleNamespace(
+            sha256_hash=sha256_hash, value=value, length=length, word_count=words,
+            is_palindrome=palindrome, longest_palindrome_length=longest,
+            created_at=datetime(2026, 1, 1, 0, 0, second),
+        ))
+
+    assert replica.query(word_count=1, limit=10) == ["h2", "h4", "h3"]
+    assert replica.query(contains_character="K") == ["h3"]
+    assert replica.query(contains_character=chr(0x3b1 + 69)) == ["h4"]
+    assert replica.query(min_palindrome_length=5, max_length=6) == ["h3"]
+    assert replica.query(limit=2, offset=1) == ["h2", "h4"]
+    assert not replica.supports(contains="ab") and not replica.supports(contains_character="%")
+
+    replica.remove("h3")
+    assert "h3" not in replica and len(replica) == 3
+    assert replica.query(is_palindrome=False, limit=10) == ["h1", "h2", "h4"]
+
+
+@pytest.mark.asyncio
+async def test_filters_answered_from_columnar_replica(client: AsyncClient):
+    for value in ["racecar", "kayak", "hello world", "zebra", "noon noon"]:
+        await client.post("/strings", json={"value": value})
+    queries = [
+        "/strings?is_palindrome=true&limit=10",
+        "/strings?contains_character=Z",
+        "/strings?word_count=2&min_length=5",
+        "/strings?min_palindrome_length=4&limit=2&offset=1",
+        "/strings/filter-by-natural-language?query=single word palindrome strings&limit=5",
+    ]
+    expected = [(await client.get(query)).json()["data"] for query in queries]
+
+    async with TestingSessionLocal() as session:
+        await load_columnar_replica([session])
+    assert len(columnar_replica) == 5
+    for query, data in zip(queries, expected):
+        assert (await client.get(query)).json()["data"] == data
+
+    # explain reports the path that actually runs: the mask, then by-hash IN queries
+    data = (await client.get("/strings?is_palindrome=true&limit=2&explain=true")).json()
+    assert data["source"] == "columnar_replica"
+    assert data["hashes"] == 2 and data["timings_ms"]["mask"] is not None
+    assert "strings.sha256_hash IN" in data["sql"] and "is_palindrome =" not in data["sql"]
+    assert data["row_counts"] == {"matched": 3, "fetched": 2, "returned": 2}
+    assert any("ix_strings_sha256_hash_live" in line for line in data["shards"][0]["plan"])
+    data = (await client.get("/strings?contains=race&explain=true")).json()
+    assert data["source"] == "database" and data["hashes"] is None
+
+    # Kept in sync with writes
+    await client.delete("/strings/kayak")
+    await client.post("/strings", json={"value": "stats"})
+    response = await client.get("/strings?is_palindrome=true&word_count=1")
+    assert sorted(item["value"] for item in response.json()["data"]) == ["racecar", "stats"]
+    assert "kayak" not in [item["value"] for item in (await client.get(queries[0])).json()["data"]]
+
+
+@pytest.mark.asyncio
+async def test_lookup_many_strings(client: AsyncClient, monkeypatch):
+    # Small chunks so one request spans several IN queries
+    monkeypatch.setattr("src.service.HASH_CHUNK_SIZE", 2)
+    stored = ["alpha", "beta", "gamma", "delta", "epsilon"]
+    for value in stored:
+        await client.post("/strings", json={"value": value})
+    await client.delete("/strings/delta")
+
+    response = await client.post(
+        "/strings/lookup",
+        json={"values": ["gamma", "missing", "alpha", "delta", "epsilon", "gamma", "beta"]},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["value"] for item in data["data"]] == ["gamma", "alpha", "epsilon", "beta"]
+    assert data["count"] == 4
+    assert data["misses"] == ["missing", "delta"]
+
+    service = StringService()
+    ids = [service.sha256_hash("epsilon").upper(), "not-a-hash", service.sha256_hash("beta")]
+    data = (await client.post("/strings/lookup", json={"ids": ids})).json()
+    assert [item["value"] for item in data["data"]] == ["epsilon", "beta"]
+    assert data["misses"] == ["not-a-hash"]
+
+    assert (await client.post("/strings/lookup", json={})).status_code == 400
+    assert (await client.post("/strings/lookup", json={"values": ["a"], "ids": []})).status_code == 400
+    too_many = {"values": [str(i) for i in range(1001)]}
+    response = await client.post("/strings/lookup", json=too_many)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "At most 1000 values or ids per request."
+    assert (await client.post("/strings/lookup", json={"ids": too_many["values"]})).status_code == 400
+
+
+@pytest_asyncio.fixture(scope="function")
+async def sharded_client(client: AsyncClient, tmp_path):
+    """Client whose StringCRUD spreads rows over the test database plus two SQLite files"""
+    shard_engines = [
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / f'shard{i}.db'}") for i in (1, 2)
+    ]
+    for shard_engine in shard_engines:
+        async with shard_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    shard_makers = [
+        async_sessionmaker(bind=shard_engine, class_=AsyncSession, expire_on_commit=False)
+        for shard_engine in shard_engines
+    ]
+
+    async def override_get_shard_sessions():
+        sessions = [maker() for maker in shard_makers]
+        try:
+            yield sessions
+        finally:
+            for session in sessions:
+                await session.close()
+
+    app.dependency_overrides[get_shard_sessions] = override_get_shard_sessions
+    try:
+        yield client, [TestingSessionLocal, *shard_makers]
+    finally:
+        del app.dependency_overrides[get_shard_sessions]
+        for shard_engine in shard_engines:
+            await shard_engine.dispose()
+
+@pytest.mark.asyncio
+async def test_sharded_point_operations_and_scatter_gather(sharded_client):
+    client, shard_makers = sharded_client
+    values = [f"shard value {i}" for i in range(12)]
+    for value in values:
+        assert (await client.post("/strings", json={"value": value})).status_code == 201
+
+    # Every row lives on exactly the shard its hash routes to
+    per_shard = []
+    for shard, maker in enumerate(shard_makers):
+        async with maker() as session:
+            rows = (await session.execute(select(Strings))).scalars().all()
+        assert all(shard_index(row.sha256_hash, 3) == shard for row in rows)
+        per_shard.append(len(rows))
+    assert sum(per_shard) == len(values) and all(per_shard)
+
+    assert (await client.get("/strings/shard value 7")).status_code == 200
+    assert (await client.post("/strings", json={"value": "shard value 7"})).status_code == 409
+    assert (await client.delete("/strings/shard value 7")).status_code == 200
+    values.remove("shard value 7")
+
+    response = await client.get("/strings?contains=value")
+    assert sorted(item["value"] for item in response.json()["data"]) == sorted(values)
+
+    # Pages merged across shards are disjoint, ordered and cover everything
+    pages = []
+    for offset in range(0, len(values), 4):
+        response = await client.get(f"/strings?word_count=3&limit=4&offset={offset}")
+        pages.extend(response.json()["data"])
+    keys = [(item["created_at"], item["id"]) for item in pages]
+    assert keys == sorted(keys)
+    assert sorted(item["value"] for item in pages) == sorted(values)
+
+    response = await client.get("/strings/filter-by-natural-language?query=strings containing 'value 1'&limit=2")
+    assert response.json()["count"] == 2
+
+    response = await client.post("/strings/lookup", json={"values": ["shard value 3", "shard value 7", "shard value 0"]})
+    data = response.json()
+    assert [item["value"] for item in data["data"]] == ["shard value 3", "shard value 0"]
+    assert data["misses"] == ["shard value 7"]
+
+    response = await client.get("/strings?word_count=3&limit=4&offset=4&explain=true")
+    data = response.json()
+    # Each of the three shards is asked for its first offset + limit rows
+    assert len(data["shards"]) == 3
+    assert all(shard["rows"] <= 8 for shard in data["shards"])
+    assert data["row_counts"]["matched"] == len(values)
+    assert data["row_counts"]["returned"] == 4
+
+@pytest.mark.asyncio
+async def test_bulk_loader_skips_duplicates_and_resumes(setup_database, tmp_path, monkeypatch):
+    async def no_init_db():
+        pass
+
+    monkeypatch.setattr(loader, "shard_sessions", [TestingSessionLocal])
+    monkeypatch.setattr(loader, "init_db", no_init_db)
+    source = tmp_path / "strings.ndjson"
+    source.write_text(
+        '{"value": "alpha"}\n"beta"\nnot json\n{"value": "alpha"}\n\n{"value": "gamma"}\n'
+    )
+    checkpoint = loader.Checkpoint(tmp_path / "strings.ndjson.checkpoint", source)
+    await loader.load(source, "ndjson", "value", batch_size=2, workers=1, checkpoint=checkpoint)
+    assert (checkpoint.records, checkpoint.inserted, checkpoint.skipped, checkpoint.invalid) == (5, 3, 1, 1)
+
+    async with TestingSessionLocal() as session:
+        rows = (await session.execute(select(Strings))).scalars().all()
+    assert sorted(row.value for row in rows) == ["alpha", "beta", "gamma"]
+    gamma = next(row for row in rows if row.value == "gamma")
+    assert gamma.longest_palindrome_length == 4 and gamma.anagram_signature == "aagmm"
+
+    # Rerunning resumes from the checkpoint and only handles appended records
+    with open(source, "a") as handle:
+        handle.write('{"value": "delta"}\n')
+    checkpoint = loader.Checkpoint(checkpoint.path, source)
+    await loader.load(source, "ndjson", "value", batch_size=2, workers=1, checkpoint=checkpoint)
+    assert (checkpoint.records, checkpoint.inserted) == (6, 4)
+
+@pytest.mark.asyncio
+async def test_bulk_loader_checks_duplicates_in_chunks(setup_database, monkeypatch):
+    # Batches larger than one IN chunk must still find every stored string
+    monkeypatch.setattr(loader, "HASH_CHUNK_SIZE", 2)
+    values = ["one", "two", "three", "four", "five"]
+    async with TestingSessionLocal() as session:
+        assert await loader.store_batch([session], loader.analyze_batch(values)) == 5
+        assert await loader.store_batch([session], loader.analyze_batch(values + ["six"])) == 1
+
+def test_bulk_loader_reads_csv(tmp_path):
+    source = tmp_path / "strings.csv"
+    source.write_text('id,text\n1,"hello, world"\n2,racecar\n')
+    assert list(loader.read_values(source, "csv", "text")) == ["hello, world", "racecar"]
@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.cache import bump_generation
+from src.db import Strings, StringTrigrams, config, shard_sessions
+from src.log import setup_logger
+from src.service import on_string_deleted
+
+# Set up logger
+logger = setup_logger(__name__, "worker.log")
+
+
+async def purge_tombstones(session: AsyncSession, batch_size: int) -> int:
+    """
+    Physically delete soft-deleted rows, one bounded batch at a time.
+
+    Each batch is its own short transaction so the purge never holds locks
+    on a large slice of the table.
+
+    Returns:
+        int: The number of rows purged.
+    """
+    purged = 0
+    while True:
+        ids = (
+            await session.execute(
+                select(Strings.id)
+                .where(Strings.deleted_at.is_not(None))
+                .limit(batch_size)
+            )
+        ).scalars().all()
+        if not ids:
+            break
+
+        await session.execute(
+            delete(StringTrigrams).where(StringTrigrams.string_id.in_(ids))
+        )
+        await session.execute(delete(Strings).where(Strings.id.in_(ids)))
+        await session.commit()
+        purged += len(ids)
+        if len(ids) < batch_size:
+            break
+        # Give request handlers a chance to run between batches
+        await asyncio.sleep(0)
+
+    if purged:
+        logger.info(f"Purged {purged} tombstoned strings.")
+    return purged
+
+
+async def expire_strings(session: AsyncSession, ttl_seconds: int, batch_size: int) -> int:
+    """
+    Tombstone live rows whose created_at is older than the retention TTL.
+
+    Expired rows go through the same soft-delete path as API deletes, so they
+    disappear from reads immediately and are purged by `purge_tombstones`.
+
+    Returns:
+        int: The number of rows expired.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+    expired = 0
+    while True:
+        strings = (
+            await session.execute(
+                select(Strings)
+                .where(Strings.deleted_at.is_(None), Strings.created_at < cutoff)
+                .limit(batch_size)
+            )
+        ).scalars().all()
+        if not strings:
+            break
+
+        await session.execute(
+            update(Strings)
+            .where(Strings.id.in_([string.id for string in strings]))
+            .values(deleted_at=func.now())
+        )
+        await bump_generation(session)
+        await session.commit()
+        for string in strings:
+            on_string_deleted(string)
+        expired += len(strings)
+        if len(strings) < batch_size:
+            break
+        await asyncio.sleep(0)
+
+    if expired:
+        logger.info(f"Expired {expired} strings older than {ttl_seconds}s.")
+    return expired
+
+
+async def compaction_worker(
+    session_factories: list[async_sessionmaker] = shard_sessions,
+    interval: float = config.PURGE_INTERVAL_SECONDS,
+    batch_size: int = config.PURGE_BATCH_SIZE,
+    ttl_seconds: int = config.RETENTION_TTL_SECONDS,
+):
+    """
+    Run TTL expiry (when configured) and tombstone purging on every shard, forever.
+
+    Started as a background task from the application lifespan and stopped
+    by cancelling it. Errors in one pass are logged and retried next interval.
+    """
+    logger.info(
+        f"Compaction worker started: interval={interval}s, batch_size={batch_size}, ttl={ttl_seconds}."
+    )
+    while True:
+        for shard, session_factory in enumerate(session_factories):
+            try:
+                async with session_factory() as session:
+                    if ttl_seconds:
+                        await expire_strings(session, ttl_seconds, batch_size)
+                    await purge_tombstones(session, batch_size)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Compaction pass failed on shard {shard}: {str(e)}")
+        await asyncio.sleep(interval)